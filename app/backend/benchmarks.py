@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import itertools
+import json
+import platform
+import random
+import re
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+from .dedup import dedup_chunks
+from .embeddings import LocalSentenceTransformerEmbedder
+from .ingest import split_chunks
+from .prompts import build_chat_prompt, build_context
+from .vectorstores import Chunk, LocalNpyVectorStore, PgVectorStore
+
+_WORD_RE = re.compile(r"\w+")
+
+_VOCABULARY = (
+    "voltage current resistance impedance reactance capacitor inductor resistor transistor diode "
+    "amplifier op-amp feedback gain bandwidth frequency phasor thevenin norton superposition mesh "
+    "node kirchhoff ohm power factor transformer winding flux induction motor generator rectifier "
+    "inverter converter mosfet bjt junction bias saturation cutoff laplace fourier transfer function "
+    "pole zero bode nyquist stability damping resonance filter lowpass highpass bandpass signal "
+    "sampling quantization modulation carrier antenna transmission line waveguide "
+    "the a of and in to is for with by as on that this from at"
+).split()
+
+
+class HashingEmbedder:
+    provider = "benchmark"
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}"
+        self._token_cache: dict[str, tuple[int, float]] = {}
+
+    def embed_texts(self, texts: Sequence[str], show_progress_bar: bool = False) -> np.ndarray:
+        del show_progress_bar
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in _WORD_RE.findall(text.lower()):
+                column, sign = self._slot(token)
+                vectors[row, column] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.embed_texts([query])[0]
+
+    def _slot(self, token: str) -> tuple[int, float]:
+        slot = self._token_cache.get(token)
+        if slot is None:
+            digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            slot = (digest % self.dimensions, 1.0 if digest >> 63 else -1.0)
+            self._token_cache[token] = slot
+        return slot
+
+
+def synthetic_text(rng: random.Random, n_chars: int) -> str:
+    words: List[str] = []
+    length = 0
+    while length < n_chars:
+        word = rng.choice(_VOCABULARY)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:n_chars]
+
+
+def synthetic_corpus(
+    n_chunks: int,
+    seed: int = 0,
+    books: int = 20,
+    chunk_size: int = 1200,
+    chunks_per_page: int = 3,
+) -> List[dict]:
+    rng = random.Random(seed)
+    chunks: List[dict] = []
+    per_book = max(1, -(-n_chunks // books))
+    for i in range(n_chunks):
+        book, offset = divmod(i, per_book)
+        page, part = divmod(offset, chunks_per_page)
+        title = f"book{book:03d}"
+        chunks.append(
+            {
+                "chunk_id": f"{title}-p{page + 1}-c{part + 1}",
+                "text": synthetic_text(rng, chunk_size),
+                "source": f"/data/pdfs/{title}.pdf",
+                "page": page + 1,
+                "title": title,
+            }
+        )
+    return chunks
+
+
+def synthetic_queries(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed + 1)
+    return [synthetic_text(rng, rng.randint(40, 160)) for _ in range(n)]
+
+
+def _timings(fn: Callable[[], object], repeat: int, warmup: int = 3) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "runs": repeat,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_ms": samples[0],
+    }
+
+
+def bench_search(store, embedder: HashingEmbedder, queries: Sequence[str], top_ks: Sequence[int]) -> List[dict]:
+    results: List[dict] = []
+    for top_k in top_ks:
+        cycle = itertools.cycle(queries)
+        stats = _timings(lambda: store.search(next(cycle), top_k=top_k, embedder=embedder), repeat=len(queries))
+        results.append({"top_k": top_k, **stats})
+    return results
+
+
+def bench_ingest(corpus: Sequence[dict], embedder: HashingEmbedder, index_dir: Path, seed: int) -> dict:
+    rng = random.Random(seed + 2)
+    pages = [synthetic_text(rng, 3000) for _ in range(max(1, len(corpus) // 3))]
+
+    start = time.perf_counter()
+    split = [chunk for text in pages for chunk in split_chunks(text, 1200, 200)]
+    split_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    unique, duplicates = dedup_chunks(corpus)
+    dedup_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    LocalNpyVectorStore(index_dir).save(unique, embedder)
+    save_seconds = time.perf_counter() - start
+
+    return {
+        "pages": len(pages),
+        "split_chunks": len(split),
+        "split_chunks_per_second": len(split) / split_seconds if split_seconds else None,
+        "dedup_chunks_per_second": len(corpus) / dedup_seconds if dedup_seconds else None,
+        "duplicates": len(duplicates),
+        "save_chunks_per_second": len(unique) / save_seconds if save_seconds else None,
+    }
+
+
+def bench_prompt(corpus: Sequence[dict], top_ks: Sequence[int], repeat: int) -> List[dict]:
+    chunks = [LocalNpyVectorStore._chunk_from_dict(raw) for raw in corpus]
+    results: List[dict] = []
+    for top_k in top_ks:
+        selected: List[Chunk] = chunks[:top_k]
+        context = _timings(lambda: build_context(selected), repeat=repeat)
+        prompt = _timings(lambda: build_chat_prompt("Find the Thevenin equivalent.", selected), repeat=repeat)
+        results.append({"top_k": top_k, "build_context": context, "build_chat_prompt": prompt})
+    return results
+
+
+def bench_embedding_backends(specs: Sequence[str], texts: Sequence[str], queries: Sequence[str]) -> List[dict]:
+    # The first spec is the reference: drift is the cosine between its vectors and
+    # each other backend's, plus how much of its top-10 retrieval set survives.
+    results: List[dict] = []
+    reference: tuple[np.ndarray, np.ndarray] | None = None
+    for spec in specs:
+        backend, _, quantization = spec.partition("-")
+        embedder = LocalSentenceTransformerEmbedder(backend=backend, quantization=quantization)
+        start = time.perf_counter()
+        embedder.embed_texts(texts[:8])
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectors = embedder.embed_texts(texts)
+        texts_seconds = time.perf_counter() - start
+        query_stats = _timings(lambda: embedder.embed_query(queries[0]), repeat=len(queries))
+        query_vectors = embedder.embed_texts(queries)
+
+        row: dict = {
+            "backend": spec,
+            "load_seconds": load_seconds,
+            "texts_per_second": len(texts) / texts_seconds if texts_seconds else None,
+            "embed_query": query_stats,
+        }
+        if reference is None:
+            reference = (vectors, query_vectors)
+        else:
+            ref_vectors, ref_queries = reference
+            cosines = np.sum(vectors * ref_vectors, axis=1)
+            k = min(10, len(texts))
+            ref_top = np.argsort(-(ref_queries @ ref_vectors.T), axis=1)[:, :k]
+            top = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :k]
+            overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, top)]
+            row.update(
+                {
+                    "reference": specs[0],
+                    "mean_cosine": float(cosines.mean()),
+                    "min_cosine": float(cosines.min()),
+                    "top10_overlap": float(np.mean(overlap)),
+                }
+            )
+        results.append(row)
+    return results
+
+
+def run(args: argparse.Namespace) -> dict:
+    embedder = HashingEmbedder(args.dimensions)
+    queries = synthetic_queries(args.queries, args.seed)
+    report: dict = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "seed": args.seed,
+            "dimensions": args.dimensions,
+            "queries": args.queries,
+        },
+        "search": [],
+        "ingest": [],
+        "prompt": [],
+        "pgvector": [],
+        "embedding_backends": [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            corpus = synthetic_corpus(size, seed=args.seed)
+            index_dir = Path(tmp) / f"index-{size}"
+            report["ingest"].append({"corpus_size": size, **bench_ingest(corpus, embedder, index_dir, args.seed)})
+
+            store = LocalNpyVectorStore(index_dir).load(embedder=embedder)
+            for row in bench_search(store, embedder, queries, args.top_k):
+                report["search"].append({"store": "local", "corpus_size": size, **row})
+
+            if args.pgvector_url:
+                pg_store = PgVectorStore(args.pgvector_url, index="benchmark")
+                start = time.perf_counter()
+                pg_store.save(corpus, embedder)
+                save_seconds = time.perf_counter() - start
+                for row in bench_search(pg_store, embedder, queries, args.top_k):
+                    report["pgvector"].append(
+                        {"corpus_size": size, "save_chunks_per_second": size / save_seconds, **row}
+                    )
+
+        report["prompt"] = bench_prompt(synthetic_corpus(max(args.top_k), seed=args.seed), args.top_k, args.queries)
+
+    if args.embedding_backends:
+        texts = [chunk["text"] for chunk in synthetic_corpus(args.embedding_texts, seed=args.seed)]
+        report["embedding_backends"] = bench_embedding_backends(args.embedding_backends, texts, queries)
+    return report
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deterministic retrieval, ingest and prompt benchmarks.")
+    parser.add_argument("--sizes", type=_int_list, default=[1000, 10000, 50000], help="corpus sizes in chunks")
+    parser.add_argument("--top-k", type=_int_list, default=[5, 20], help="top_k values to search with")
+    parser.add_argument("--queries", type=int, default=100, help="timed runs per measurement")
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="write the JSON report here")
+    parser.add_argument(
+        "--pgvector-url",
+        default="",
+        help="also benchmark PgVectorStore against this database, using a separate 'benchmark' index",
+    )
+    parser.add_argument(
+        "--embedding-backends",
+        type=lambda value: [v.strip() for v in value.split(",") if v.strip()],
+        default=[],
+        help="compare local embedding backends, e.g. torch,torch-int8,onnx,onnx-int8,openvino; "
+        "the first one is the drift reference (downloads EMBEDDING_MODEL)",
+    )
+    parser.add_argument("--embedding-texts", type=int, default=512, help="texts embedded per backend")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+        print(f"Wrote {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
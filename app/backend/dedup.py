@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .config import DEDUP_SHINGLE_SIZE, DEDUP_SIMHASH_DISTANCE
+
+_WORD_RE = re.compile(r"\w+")
+_FINGERPRINT_BITS = 64
+
+
+def content_hash(text: str) -> str:
+    canonical = " ".join(_WORD_RE.findall(text.lower()))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def simhash(text: str, shingle_size: int = DEDUP_SHINGLE_SIZE) -> int:
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return 0
+    size = max(1, min(shingle_size, len(words)))
+    hashes = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(" ".join(words[i : i + size]).encode("utf-8"), digest_size=8).digest(), "little")
+            for i in range(len(words) - size + 1)
+        ),
+        dtype=np.uint64,
+    )
+    bits = np.unpackbits(hashes.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(hashes)
+    return int.from_bytes(np.packbits(votes, bitorder="little").tobytes(), "little")
+
+
+# Near duplicates are SimHash fingerprints within ``max_distance`` bits. The
+# fingerprint is split into ``max_distance + 1`` bands, so any pair within the
+# distance shares at least one identical band and only bucket mates are compared.
+class ChunkDeduplicator:
+    def __init__(self, max_distance: int = DEDUP_SIMHASH_DISTANCE, shingle_size: int = DEDUP_SHINGLE_SIZE):
+        if max_distance < 0:
+            raise ValueError("max_distance must be greater than or equal to 0")
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self._bands = min(max_distance + 1, _FINGERPRINT_BITS)
+        self._band_bits = -(-_FINGERPRINT_BITS // self._bands)
+        self._exact: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[int, int], List[Tuple[int, str]]] = {}
+
+    def check(self, chunk: dict) -> Tuple[str, str] | None:
+        digest = content_hash(chunk["text"])
+        canonical = self._exact.get(digest)
+        if canonical is not None:
+            return canonical, "exact"
+
+        fingerprint = simhash(chunk["text"], self.shingle_size)
+        keys = self._band_keys(fingerprint)
+        if self.max_distance > 0:
+            for key in keys:
+                for other, other_id in self._buckets.get(key, ()):
+                    if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                        return other_id, "near"
+
+        self._exact[digest] = chunk["chunk_id"]
+        if self.max_distance > 0:
+            for key in keys:
+                self._buckets.setdefault(key, []).append((fingerprint, chunk["chunk_id"]))
+        return None
+
+    def _band_keys(self, fingerprint: int) -> List[Tuple[int, int]]:
+        mask = (1 << self._band_bits) - 1
+        return [(band, fingerprint >> (band * self._band_bits) & mask) for band in range(self._bands)]
+
+
+def dedup_chunks(
+    chunks: Sequence[dict],
+    max_distance: int = DEDUP_SIMHASH_DISTANCE,
+    shingle_size: int = DEDUP_SHINGLE_SIZE,
+) -> Tuple[List[dict], List[dict]]:
+    # Copies are matched across the whole library. A copy in another source keeps
+    # its own row, so source and page filters still find it, but is marked with
+    # "shares_vector_of" and reuses the canonical chunk's vector. A further copy
+    # in a source that already has one adds nothing and is dropped.
+    deduplicator = ChunkDeduplicator(max_distance, shingle_size)
+    source_of: Dict[str, str] = {}
+    copy_in_source: Dict[Tuple[str, str], str] = {}
+    rows: List[dict] = []
+    duplicates: List[dict] = []
+    for chunk in chunks:
+        match = deduplicator.check(chunk)
+        if match is None:
+            source_of[chunk["chunk_id"]] = chunk["source"]
+            rows.append(chunk)
+            continue
+        canonical_id, reason = match
+        if source_of[canonical_id] != chunk["source"]:
+            key = (canonical_id, chunk["source"])
+            if key not in copy_in_source:
+                copy_in_source[key] = chunk["chunk_id"]
+                rows.append({**chunk, "shares_vector_of": canonical_id})
+                continue
+            canonical_id = copy_in_source[key]
+        duplicates.append(
+            {
+                "chunk_id": chunk["chunk_id"],
+                "duplicate_of": canonical_id,
+                "reason": reason,
+                "source": chunk["source"],
+                "page": chunk["page"],
+                "title": chunk.get("title", ""),
+            }
+        )
+    return rows, duplicates
+
+
+def rows_to_embed(rows: Sequence[dict]) -> List[dict]:
+    return [row for row in rows if "shares_vector_of" not in row]
+
+
+def expand_shared_vectors(rows: Sequence[dict], embeddings: np.ndarray) -> np.ndarray:
+    # ``embeddings`` holds one vector per rows_to_embed(rows), in the same order;
+    # a canonical row always comes before the copies that share its vector.
+    position: Dict[str, int] = {}
+    take = np.empty(len(rows), dtype=np.int64)
+    for i, row in enumerate(rows):
+        canonical_id = row.get("shares_vector_of")
+        if canonical_id is None:
+            position[row["chunk_id"]] = len(position)
+            take[i] = position[row["chunk_id"]]
+        else:
+            take[i] = position[canonical_id]
+    return embeddings[take]
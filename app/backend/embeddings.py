@@ -1,17 +1,34 @@
 from __future__ import annotations
 
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
 from typing import Protocol, Sequence
 
 import numpy as np
 import requests
 
 from .config import (
+    CACHE_DIR,
     EMBEDDING_API_KEY,
+    EMBEDDING_BACKEND,
     EMBEDDING_BASE_URL,
     EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_WINDOW_MS,
+    EMBEDDING_MAX_BATCH,
     EMBEDDING_MODEL,
+    EMBEDDING_ONNX_QUANT_CONFIG,
     EMBEDDING_PROVIDER,
+    EMBEDDING_QUANTIZATION,
+    EMBEDDING_THREADS,
 )
+from .metrics import EMBEDDING_BATCH_SIZE as BATCH_SIZE_HISTOGRAM
+from .metrics import record_cache
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "openvino")
 
 
 class Embedder(Protocol):
@@ -25,22 +42,103 @@ class Embedder(Protocol):
         ...
 
 
+ONNX_QUANT_CONFIGS = ("arm64", "avx2", "avx512", "avx512_vnni")
+
+
+def onnx_quant_file_suffix(config: str) -> str:
+    # Same suffix sentence-transformers derives itself: the weight type comes from
+    # the config (QUInt8 for avx2 and avx512, QInt8 for arm64 and avx512_vnni).
+    if config not in ONNX_QUANT_CONFIGS:
+        raise RuntimeError(f"Unsupported ONNX quantization config: {config}")
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    quantization_config = getattr(AutoQuantizationConfig, config)(is_static=False, per_channel=False)
+    return f"{quantization_config.weights_dtype.name.lower()}_{config}"
+
+
 class LocalSentenceTransformerEmbedder:
     provider = "local"
 
-    def __init__(self, model: str = EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE):
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        backend: str = EMBEDDING_BACKEND,
+        quantization: str = EMBEDDING_QUANTIZATION,
+        threads: int = EMBEDDING_THREADS,
+        onnx_quant_config: str = EMBEDDING_ONNX_QUANT_CONFIG,
+    ):
+        if backend not in EMBEDDING_BACKENDS:
+            raise RuntimeError(f"Unsupported embedding backend: {backend}")
+        if quantization not in ("", "int8"):
+            raise RuntimeError(f"Unsupported embedding quantization: {quantization}")
         self.model = model
         self.batch_size = batch_size
+        self.backend = backend
+        self.quantization = quantization
+        self.threads = threads
+        self.onnx_quant_config = onnx_quant_config
         self._client = None
 
     @property
     def client(self):
         if self._client is None:
-            from sentence_transformers import SentenceTransformer
-
-            self._client = SentenceTransformer(self.model)
+            self._client = self._load_client()
         return self._client
 
+    def _load_client(self):
+        from sentence_transformers import SentenceTransformer
+
+        if self.backend == "onnx":
+            model_kwargs: dict = {"provider": "CPUExecutionProvider"}
+            if self.threads > 0:
+                import onnxruntime
+
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = self.threads
+                model_kwargs["session_options"] = options
+            if self.quantization == "int8":
+                export_dir, file_name = self._export_quantized_onnx()
+                model_kwargs["file_name"] = file_name
+                return SentenceTransformer(str(export_dir), backend="onnx", model_kwargs=model_kwargs)
+            return SentenceTransformer(self.model, backend="onnx", model_kwargs=model_kwargs)
+
+        if self.backend == "openvino":
+            model_kwargs = {}
+            if self.threads > 0:
+                model_kwargs["ov_config"] = {"INFERENCE_NUM_THREADS": str(self.threads)}
+            if self.quantization == "int8":
+                from optimum.intel import OVWeightQuantizationConfig
+
+                model_kwargs["quantization_config"] = OVWeightQuantizationConfig(bits=8)
+            return SentenceTransformer(self.model, backend="openvino", model_kwargs=model_kwargs)
+
+        import torch
+
+        if self.threads > 0:
+            torch.set_num_threads(self.threads)
+        client = SentenceTransformer(self.model, device="cpu" if self.quantization else None)
+        if self.quantization == "int8":
+            client = torch.ao.quantization.quantize_dynamic(client, {torch.nn.Linear}, dtype=torch.qint8)
+        return client
+
+    def _export_quantized_onnx(self) -> tuple[Path, str]:
+        # Dynamic int8 quantization needs no calibration data; the exported model
+        # is kept under CACHE_DIR so the export only runs once per model.
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.model)
+        export_dir = CACHE_DIR / "embedding_models" / f"{slug}-onnx"
+        file_suffix = onnx_quant_file_suffix(self.onnx_quant_config)
+        file_name = f"onnx/model_{file_suffix}.onnx"
+        if not (export_dir / file_name).exists():
+            model = SentenceTransformer(self.model, backend="onnx")
+            model.save(str(export_dir))
+            export_dynamic_quantized_onnx_model(
+                model, self.onnx_quant_config, str(export_dir), file_suffix=file_suffix
+            )
+        return export_dir, file_name
+
     def embed_texts(self, texts: Sequence[str], show_progress_bar: bool = False) -> np.ndarray:
         vectors = self.client.encode(
             list(texts),
@@ -99,25 +197,130 @@ class OpenAICompatibleEmbedder:
         return self.embed_texts([query], show_progress_bar=False)[0]
 
 
-def get_embedder(provider: str = EMBEDDING_PROVIDER) -> Embedder:
+# Coalesces concurrent embed_query calls: a background worker waits up to
+# window_ms after the first queued query for more to arrive, then embeds up to
+# max_batch of them in one embed_texts call. Callers asking for a query that is
+# already queued or being embedded share its result.
+class BatchingEmbedder:
+    def __init__(
+        self,
+        inner: Embedder,
+        window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+        max_batch: int = EMBEDDING_MAX_BATCH,
+    ):
+        self.inner = inner
+        self.provider = inner.provider
+        self.model = inner.model
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            # Worker threads do not survive fork; children start with a clean queue.
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._queue: list[str] = []
+        self._in_flight: dict[str, Future] = {}
+        self._worker: threading.Thread | None = None
+
+    def embed_texts(self, texts: Sequence[str], show_progress_bar: bool = False) -> np.ndarray:
+        return self.inner.embed_texts(texts, show_progress_bar=show_progress_bar)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        with self._lock:
+            future = self._in_flight.get(query)
+            record_cache("embed_query_singleflight", future is not None)
+            if future is None:
+                future = Future()
+                self._in_flight[query] = future
+                self._queue.append(query)
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+                self._wakeup.notify()
+        return future.result()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._queue:
+                    self._wakeup.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                batch = self._queue[: self.max_batch]
+                del self._queue[: self.max_batch]
+
+            BATCH_SIZE_HISTOGRAM.observe(len(batch))
+            try:
+                vectors = self.inner.embed_texts(batch, show_progress_bar=False)
+                error = None
+            except Exception as exc:
+                vectors, error = None, exc
+
+            with self._lock:
+                futures = [self._in_flight.pop(query) for query in batch]
+            for i, future in enumerate(futures):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(vectors[i])
+
+
+def get_embedder(provider: str = EMBEDDING_PROVIDER, model: str | None = None) -> Embedder:
     provider = provider.lower()
     if provider == "local":
-        return LocalSentenceTransformerEmbedder()
+        return LocalSentenceTransformerEmbedder(model=model or EMBEDDING_MODEL)
     if provider == "remote":
-        return OpenAICompatibleEmbedder()
+        return OpenAICompatibleEmbedder(model=model or EMBEDDING_MODEL)
     raise RuntimeError(f"Unsupported embedding provider: {provider}")
 
 
+def _with_query_batching(embedder: Embedder) -> Embedder:
+    if EMBEDDING_BATCH_WINDOW_MS > 0:
+        return BatchingEmbedder(embedder)
+    return embedder
+
+
 _default_embedder: Embedder | None = None
+_embedders: dict[tuple[str, str], Embedder] = {}
+_embedders_lock = threading.Lock()
 
 
 def get_default_embedder() -> Embedder:
     global _default_embedder
     if _default_embedder is None:
-        _default_embedder = get_embedder()
+        _default_embedder = _with_query_batching(get_embedder())
     return _default_embedder
 
 
+def get_embedder_for(provider: str, model: str) -> Embedder:
+    # Indexes may be built with different embedding models; each model is loaded
+    # once per process and shared by every index that uses it.
+    default = get_default_embedder()
+    if (provider, model) == (default.provider, default.model):
+        return default
+    with _embedders_lock:
+        embedder = _embedders.get((provider, model))
+        if embedder is None:
+            embedder = _with_query_batching(get_embedder(provider, model))
+            _embedders[(provider, model)] = embedder
+    return embedder
+
+
+def load_model(embedder: Embedder) -> None:
+    # Loads local model weights without running inference, so a pre-fork master
+    # doesn't start the math library's thread pools, which children can't reuse.
+    inner = getattr(embedder, "inner", embedder)
+    if isinstance(inner, LocalSentenceTransformerEmbedder):
+        inner.client
+
+
 # Backward-compatible helpers for existing call sites and scripts.
 def embed_texts(texts: Sequence[str], show_progress_bar: bool = False) -> np.ndarray:
     return get_default_embedder().embed_texts(texts, show_progress_bar=show_progress_bar)
@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+
+from .config import TOP_K, VECTOR_STORE_PROVIDER
+from .embeddings import Embedder, get_embedder_for
+from .vectorstores import INDEX_ID, LocalNpyVectorStore, PgVectorStore, _to_pgvector
+
+# Rows are upcast to float32 in blocks of this many, so compressed matrices
+# never need a full-size float32 copy.
+_BLOCK_ROWS = 8192
+
+
+def _blocked_scores(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    return np.concatenate(
+        [
+            matrix[start : start + _BLOCK_ROWS].astype(np.float32) @ query
+            for start in range(0, len(matrix), _BLOCK_ROWS)
+        ]
+    )
+
+
+def _top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[0])
+    if k < scores.shape[0]:
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+    return np.argsort(-scores)
+
+
+class ExactSearch:
+    def __init__(self, embeddings: np.ndarray):
+        self.name = "exact-fp32"
+        self.params: dict = {}
+        self.matrix = embeddings
+        self.memory_bytes = embeddings.nbytes
+        self.build_seconds = 0.0
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        return _top_rows(self.matrix @ query, k)
+
+
+class Float16Search:
+    def __init__(self, embeddings: np.ndarray):
+        start = time.perf_counter()
+        self.name = "fp16"
+        self.params: dict = {}
+        self.matrix = embeddings.astype(np.float16)
+        self.memory_bytes = self.matrix.nbytes
+        self.build_seconds = time.perf_counter() - start
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        return _top_rows(_blocked_scores(self.matrix, query), k)
+
+
+class Int8Search:
+    def __init__(self, embeddings: np.ndarray, rescore: int = 0):
+        # Symmetric per-dimension scales. With rescore > 0 the best k * rescore
+        # candidates are re-ranked with their float32 rows. Those rows stay in RAM
+        # here, so they count towards memory like they do towards latency.
+        start = time.perf_counter()
+        self.name = f"int8-rescore{rescore}" if rescore else "int8"
+        self.params = {"rescore": rescore}
+        self.rescore = rescore
+        self.full = embeddings
+        scales = np.abs(embeddings).max(axis=0)
+        scales[scales == 0] = 1.0
+        self.scales = (scales / 127).astype(np.float32)
+        self.matrix = np.round(embeddings / self.scales).astype(np.int8)
+        self.memory_bytes = self.matrix.nbytes + self.scales.nbytes + (self.full.nbytes if rescore else 0)
+        self.build_seconds = time.perf_counter() - start
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        scores = _blocked_scores(self.matrix, query * self.scales)
+        if not self.rescore:
+            return _top_rows(scores, k)
+        candidates = _top_rows(scores, k * self.rescore)
+        exact = self.full[candidates] @ query
+        return candidates[_top_rows(exact, k)]
+
+
+class IVFSearch:
+    def __init__(self, embeddings: np.ndarray, nlist: int, nprobe: int, seed: int = 0, iterations: int = 10):
+        start = time.perf_counter()
+        self.name = f"ivf{nlist}-nprobe{nprobe}"
+        self.params = {"nlist": nlist, "nprobe": nprobe}
+        self.nprobe = min(nprobe, nlist)
+        self.centroids = _spherical_kmeans(embeddings, nlist, seed, iterations)
+        assignments = np.argmax(embeddings @ self.centroids.T, axis=1)
+        # Rows are stored grouped by list so each probed list is one contiguous slice.
+        self.order = np.argsort(assignments, kind="stable")
+        self.matrix = embeddings[self.order]
+        counts = np.bincount(assignments, minlength=nlist)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.memory_bytes = self.matrix.nbytes + self.centroids.nbytes + self.order.nbytes + self.offsets.nbytes
+        self.build_seconds = time.perf_counter() - start
+
+    @classmethod
+    def with_nprobe(cls, base: "IVFSearch", nprobe: int) -> "IVFSearch":
+        clone = object.__new__(cls)
+        clone.__dict__.update(base.__dict__)
+        clone.nprobe = min(nprobe, len(base.centroids))
+        clone.name = f"ivf{len(base.centroids)}-nprobe{nprobe}"
+        clone.params = {"nlist": len(base.centroids), "nprobe": nprobe}
+        return clone
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        lists = _top_rows(self.centroids @ query, self.nprobe)
+        rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+        if rows.shape[0] == 0:
+            return rows
+        top = _top_rows(self.matrix[rows] @ query, k)
+        return self.order[rows[top]]
+
+
+def _spherical_kmeans(embeddings: np.ndarray, nlist: int, seed: int, iterations: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(embeddings), max(nlist * 64, 10000))
+    sample = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = np.bincount(assignments, minlength=nlist) == 0
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class PgHnswSearch:
+    def __init__(
+        self,
+        store: PgVectorStore,
+        chunk_rows: dict[str, int],
+        ef_search: int,
+        build_seconds: float,
+        index_bytes: int,
+    ):
+        # memory_bytes is the size of the HNSW index Postgres needs in its buffer cache.
+        self.name = f"pgvector-hnsw-ef{ef_search}"
+        self.params = {"ef_search": ef_search}
+        self.store = store
+        self.chunk_rows = chunk_rows
+        self.ef_search = ef_search
+        self.memory_bytes = index_bytes
+        self.build_seconds = build_seconds
+        self._conn = None
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        import psycopg
+
+        if self._conn is None:
+            self._conn = psycopg.connect(self.store.database_url, autocommit=True)
+            with self._conn.cursor() as cur:
+                cur.execute(f"SET hnsw.ef_search = {int(self.ef_search)}")
+        with self._conn.cursor() as cur:
+            cur.execute(
+                f"SELECT chunk_id FROM {self.store.table} ORDER BY embedding <=> %s::vector LIMIT %s",
+                (_to_pgvector(query), k),
+            )
+            return np.asarray([self.chunk_rows[row[0]] for row in cur.fetchall()], dtype=np.int64)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def build_pg_hnsw(
+    database_url: str,
+    chunks: Sequence[dict],
+    embeddings: np.ndarray,
+    embedder: Embedder,
+) -> tuple[PgVectorStore, float, int]:
+    # Writes to a dedicated 'evaluation' index so production tables are never altered.
+    import psycopg
+
+    store = PgVectorStore(database_url, index="evaluation")
+    store.write(chunks, embeddings, embedder)
+    start = time.perf_counter()
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP INDEX IF EXISTS {store.table}_embedding_hnsw_idx")
+            cur.execute(
+                f"CREATE INDEX {store.table}_embedding_hnsw_idx ON {store.table} "
+                "USING hnsw (embedding vector_cosine_ops)"
+            )
+            build_seconds = time.perf_counter() - start
+            cur.execute(f"SELECT pg_relation_size('{store.table}_embedding_hnsw_idx')")
+            index_bytes = int(cur.fetchone()[0])
+    return store, build_seconds, index_bytes
+
+
+def ground_truth(embeddings: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    return np.stack([_top_rows(embeddings @ query, k) for query in queries])
+
+
+def evaluate_method(method, queries: np.ndarray, truth: np.ndarray, ks: Sequence[int]) -> dict:
+    max_k = max(ks)
+    latencies: List[float] = []
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks: List[float] = []
+    for query in queries[: min(3, len(queries))]:
+        method.search(query, max_k)
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = method.search(query, max_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        for k in ks:
+            recalls[k].append(len(set(found[:k].tolist()) & set(expected[:k].tolist())) / k)
+        hits = np.flatnonzero(found == expected[0])
+        reciprocal_ranks.append(1.0 / (hits[0] + 1) if hits.size else 0.0)
+    latencies.sort()
+    return {
+        "method": method.name,
+        "params": method.params,
+        **{f"recall@{k}": float(np.mean(recalls[k])) for k in ks},
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "mean_ms": statistics.fmean(latencies),
+        "memory_bytes": int(method.memory_bytes),
+        "build_seconds": method.build_seconds,
+    }
+
+
+def mark_pareto(rows: List[dict], k: int) -> None:
+    # A configuration is on the frontier when no other one is at least as good on
+    # recall@k, p50 latency and memory, and strictly better on one of them.
+    key = f"recall@{k}"
+
+    def dominates(a: dict, b: dict) -> bool:
+        no_worse = a[key] >= b[key] and a["p50_ms"] <= b["p50_ms"] and a["memory_bytes"] <= b["memory_bytes"]
+        better = a[key] > b[key] or a["p50_ms"] < b["p50_ms"] or a["memory_bytes"] < b["memory_bytes"]
+        return no_worse and better
+
+    for row in rows:
+        row["pareto"] = not any(dominates(other, row) for other in rows if other is not row)
+
+
+def load_index(index: str, provider: str) -> tuple[List[dict], np.ndarray, Embedder]:
+    if provider == "local":
+        store = LocalNpyVectorStore(index=index).load()
+        assert store.embeddings is not None
+        chunks = [vars(chunk) for chunk in store.chunks]
+        embeddings = store.embeddings
+        config = store.embedding_config
+    elif provider == "pgvector":
+        import psycopg
+
+        store = PgVectorStore(index=index).load()
+        config = store.embedding_config
+        with psycopg.connect(store.database_url) as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"SELECT chunk_id, text, source, page, title, embedding::text FROM {store.table} ORDER BY id"
+                )
+                rows = cur.fetchall()
+        chunks = [{"chunk_id": r[0], "text": r[1], "source": r[2], "page": r[3], "title": r[4]} for r in rows]
+        embeddings = np.asarray([json.loads(r[5]) for r in rows], dtype=np.float32)
+    else:
+        raise RuntimeError(f"Unsupported vector store provider: {provider}")
+    if not config.get("provider") or not config.get("model"):
+        raise ValueError(f"Index '{index}' has no embedding config; re-run ingest.py")
+    return chunks, embeddings, get_embedder_for(config["provider"], config["model"])
+
+
+def sample_queries(chunks: Sequence[dict], n: int, seed: int, words: int = 16) -> List[str]:
+    # Without a query set, windows of chunk text stand in for student questions.
+    rng = random.Random(seed)
+    queries: List[str] = []
+    for chunk in rng.sample(list(chunks), min(n, len(chunks))):
+        tokens = chunk["text"].split()
+        start = rng.randint(0, max(0, len(tokens) - words))
+        queries.append(" ".join(tokens[start : start + words]))
+    return queries
+
+
+def read_queries(path: Path) -> List[str]:
+    queries: List[str] = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        queries.append(str(json.loads(line)["query"]) if line.startswith("{") else line)
+    return queries
+
+
+def run(args: argparse.Namespace) -> dict:
+    if args.synthetic:
+        from .benchmarks import HashingEmbedder, synthetic_corpus, synthetic_queries
+
+        chunks = synthetic_corpus(args.synthetic, seed=args.seed)
+        embedder: Embedder = HashingEmbedder(args.dimensions)
+        embeddings = embedder.embed_texts([chunk["text"] for chunk in chunks])
+        queries = synthetic_queries(args.num_queries, args.seed)
+    else:
+        chunks, embeddings, embedder = load_index(args.index, args.store)
+        queries = read_queries(args.queries) if args.queries else sample_queries(chunks, args.num_queries, args.seed)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    query_vectors = np.asarray(embedder.embed_texts(queries), dtype=np.float32)
+    ks = sorted(set(args.k))
+    truth = ground_truth(embeddings, query_vectors, max(ks))
+
+    methods: list = [ExactSearch(embeddings), Float16Search(embeddings), Int8Search(embeddings)]
+    methods += [Int8Search(embeddings, rescore) for rescore in args.rescore]
+    for nlist in args.nlist or [max(1, int(4 * np.sqrt(len(embeddings))))]:
+        nlist = min(nlist, len(embeddings))
+        base = IVFSearch(embeddings, nlist, args.nprobe[0], seed=args.seed)
+        methods += [base] + [IVFSearch.with_nprobe(base, nprobe) for nprobe in args.nprobe[1:]]
+
+    results = [evaluate_method(method, query_vectors, truth, ks) for method in methods]
+
+    if args.pgvector_url:
+        store, build_seconds, index_bytes = build_pg_hnsw(args.pgvector_url, chunks, embeddings, embedder)
+        chunk_rows = {chunk["chunk_id"]: row for row, chunk in enumerate(chunks)}
+        for ef_search in args.ef_search:
+            method = PgHnswSearch(store, chunk_rows, ef_search, build_seconds, index_bytes)
+            try:
+                results.append(evaluate_method(method, query_vectors, truth, ks))
+            finally:
+                method.close()
+
+    pareto_k = args.pareto_k if args.pareto_k in ks else max(ks)
+    mark_pareto(results, pareto_k)
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "index": "synthetic" if args.synthetic else args.index,
+            "chunks": len(chunks),
+            "dimensions": int(embeddings.shape[1]),
+            "embedding": f"{embedder.provider}/{embedder.model}",
+            "queries": len(queries),
+            "k": ks,
+            "pareto_k": pareto_k,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def _print_table(report: dict) -> None:
+    ks = report["meta"]["k"]
+    pareto_k = report["meta"]["pareto_k"]
+    print(
+        f"{report['meta']['chunks']} chunks, {report['meta']['queries']} queries, "
+        f"{report['meta']['embedding']}; * = Pareto-optimal on recall@{pareto_k}, p50 and memory"
+    )
+    header = f"  {'method':<26}" + "".join(f"{'R@' + str(k):>8}" for k in ks)
+    print(header + f"{'MRR':>8}{'p50 ms':>9}{'p99 ms':>9}{'MiB':>9}")
+    for row in sorted(report["results"], key=lambda r: r["p50_ms"]):
+        line = f"{'*' if row['pareto'] else ' '} {row['method']:<26}"
+        line += "".join(f"{row[f'recall@{k}']:>8.3f}" for k in ks)
+        line += f"{row['mrr']:>8.3f}{row['p50_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['memory_bytes'] / 2**20:>9.1f}"
+        print(line)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _nonempty_int_list(value: str) -> List[int]:
+    values = _int_list(value)
+    if not values:
+        raise argparse.ArgumentTypeError("expected a comma-separated list of integers")
+    return values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure recall and latency of approximate retrieval settings against exact search."
+    )
+    parser.add_argument("--index", default=INDEX_ID, help="index to evaluate (default: %(default)s)")
+    parser.add_argument("--store", default=VECTOR_STORE_PROVIDER, choices=["local", "pgvector"])
+    parser.add_argument("--queries", type=Path, default=None, help="query file: one per line, or JSONL with 'query'")
+    parser.add_argument(
+        "--num-queries", type=int, default=200, help="queries sampled from chunk text when --queries is not given"
+    )
+    parser.add_argument("--k", type=_nonempty_int_list, default=sorted({1, 5, 10, TOP_K}), help="recall@k cut-offs")
+    parser.add_argument("--pareto-k", type=int, default=TOP_K, help="recall@k used for the Pareto frontier")
+    parser.add_argument("--rescore", type=_int_list, default=[2, 4], help="int8 rescoring factors")
+    parser.add_argument("--nlist", type=_int_list, default=[], help="IVF list counts (default: 4*sqrt(chunks))")
+    parser.add_argument(
+        "--nprobe", type=_nonempty_int_list, default=[1, 2, 4, 8, 16, 32], help="IVF lists probed per query"
+    )
+    parser.add_argument(
+        "--pgvector-url",
+        default="",
+        help="also sweep pgvector HNSW ef_search; the corpus is copied into a separate 'evaluation' index",
+    )
+    parser.add_argument("--ef-search", type=_int_list, default=[10, 20, 40, 80, 160])
+    parser.add_argument("--synthetic", type=int, default=0, help="evaluate a synthetic corpus of this many chunks")
+    parser.add_argument("--dimensions", type=int, default=384, help="embedding size for --synthetic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = run(args)
+    _print_table(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from importlib.metadata import version
+from pathlib import Path
+from typing import AbstractSet, Dict, Iterator, Protocol
+
+import pdfplumber
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+
+from .config import MIN_PAGE_TEXT_LEN, PDF_EXTRACTOR, PDF_TABLE_PATH_THRESHOLD
+
+# PDFium marks hyphens it found at line breaks with U+FFFE.
+_SOFT_HYPHEN = "\ufffe"
+
+
+@dataclass
+class PageText:
+    index: int
+    text: str
+    extractor: str
+
+
+class ExtractionStats:
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.pages: Dict[str, int] = {}
+
+    def add(self, backend: str, seconds: float, pages: int = 1) -> None:
+        self.seconds[backend] = self.seconds.get(backend, 0.0) + seconds
+        self.pages[backend] = self.pages.get(backend, 0) + pages
+
+    def merge(self, other: "ExtractionStats") -> None:
+        for backend, seconds in other.seconds.items():
+            self.add(backend, seconds, other.pages.get(backend, 0))
+
+    def summary(self) -> str:
+        parts = []
+        for backend in sorted(self.seconds):
+            pages = self.pages.get(backend, 0)
+            seconds = self.seconds[backend]
+            per_page = seconds / pages * 1000 if pages else 0.0
+            parts.append(f"{backend}: {pages} pages in {seconds:.1f}s ({per_page:.1f} ms/page)")
+        return ", ".join(parts)
+
+
+class PageTextExtractor(Protocol):
+    name: str
+    # Changes whenever the extractor could return different text for the same page.
+    cache_key: str
+
+    def extract_pages(
+        self,
+        pdf_path: Path,
+        stats: ExtractionStats | None = None,
+        skip_pages: AbstractSet[int] = frozenset(),
+    ) -> Iterator[PageText]:
+        ...
+
+
+def page_count(pdf_path: Path) -> int:
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _pdfium_text(page: pdfium.PdfPage) -> str:
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_range().replace(_SOFT_HYPHEN, "")
+    finally:
+        textpage.close()
+
+
+def _pdfium_path_count(page: pdfium.PdfPage, limit: int) -> int:
+    count = 0
+    for _ in page.get_objects(filter=(pdfium_c.FPDF_PAGEOBJ_PATH,), max_depth=2):
+        count += 1
+        if count > limit:
+            break
+    return count
+
+
+class PdfplumberExtractor:
+    name = "pdfplumber"
+    cache_key = f"pdfplumber-{version('pdfplumber')}"
+
+    def extract_pages(
+        self,
+        pdf_path: Path,
+        stats: ExtractionStats | None = None,
+        skip_pages: AbstractSet[int] = frozenset(),
+    ) -> Iterator[PageText]:
+        with pdfplumber.open(str(pdf_path)) as pdf:
+            for i, page in enumerate(pdf.pages):
+                if i in skip_pages:
+                    continue
+                start = time.perf_counter()
+                text = page.extract_text() or ""
+                page.close()
+                if stats is not None:
+                    stats.add(self.name, time.perf_counter() - start)
+                yield PageText(i, text, self.name)
+
+
+class PdfiumExtractor:
+    name = "pdfium"
+    cache_key = f"pdfium-{version('pypdfium2')}"
+
+    def extract_pages(
+        self,
+        pdf_path: Path,
+        stats: ExtractionStats | None = None,
+        skip_pages: AbstractSet[int] = frozenset(),
+    ) -> Iterator[PageText]:
+        pdf = pdfium.PdfDocument(str(pdf_path))
+        try:
+            for i in range(len(pdf)):
+                if i in skip_pages:
+                    continue
+                start = time.perf_counter()
+                page = pdf[i]
+                try:
+                    text = _pdfium_text(page)
+                finally:
+                    page.close()
+                if stats is not None:
+                    stats.add(self.name, time.perf_counter() - start)
+                yield PageText(i, text, self.name)
+        finally:
+            pdf.close()
+
+
+class HybridExtractor:
+    name = "hybrid"
+
+    def __init__(self, min_text_len: int = MIN_PAGE_TEXT_LEN, table_path_threshold: int = PDF_TABLE_PATH_THRESHOLD):
+        self.min_text_len = min_text_len
+        self.table_path_threshold = table_path_threshold
+        self.cache_key = (
+            f"hybrid-{PdfiumExtractor.cache_key}-{PdfplumberExtractor.cache_key}"
+            f"-min{min_text_len}-paths{table_path_threshold}"
+        )
+
+    def extract_pages(
+        self,
+        pdf_path: Path,
+        stats: ExtractionStats | None = None,
+        skip_pages: AbstractSet[int] = frozenset(),
+    ) -> Iterator[PageText]:
+        # PDFium returns text in content-stream order, which is fine for prose but
+        # scrambles table cells, so pages that draw many ruling lines and pages with
+        # too little text go through pdfplumber's layout analysis instead.
+        pdf = pdfium.PdfDocument(str(pdf_path))
+        plumber = None
+        try:
+            for i in range(len(pdf)):
+                if i in skip_pages:
+                    continue
+                start = time.perf_counter()
+                page = pdf[i]
+                try:
+                    text = _pdfium_text(page)
+                    table_heavy = (
+                        self.table_path_threshold > 0
+                        and _pdfium_path_count(page, self.table_path_threshold) > self.table_path_threshold
+                    )
+                finally:
+                    page.close()
+                if stats is not None:
+                    stats.add(PdfiumExtractor.name, time.perf_counter() - start)
+                if not table_heavy and len(" ".join(text.split())) >= self.min_text_len:
+                    yield PageText(i, text, PdfiumExtractor.name)
+                    continue
+
+                start = time.perf_counter()
+                if plumber is None:
+                    plumber = pdfplumber.open(str(pdf_path))
+                plumber_page = plumber.pages[i]
+                fallback = plumber_page.extract_text() or ""
+                plumber_page.close()
+                if stats is not None:
+                    stats.add(PdfplumberExtractor.name, time.perf_counter() - start)
+                if table_heavy or len(fallback.strip()) > len(text.strip()):
+                    yield PageText(i, fallback, PdfplumberExtractor.name)
+                else:
+                    yield PageText(i, text, PdfiumExtractor.name)
+        finally:
+            if plumber is not None:
+                plumber.close()
+            pdf.close()
+
+
+def get_page_extractor(name: str = PDF_EXTRACTOR) -> PageTextExtractor:
+    name = name.lower()
+    if name == "hybrid":
+        return HybridExtractor()
+    if name == "pdfium":
+        return PdfiumExtractor()
+    if name == "pdfplumber":
+        return PdfplumberExtractor()
+    raise RuntimeError(f"Unsupported PDF extractor: {name}")
@@ -0,0 +1,22 @@
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Threads overlap requests that wait on the LLM; the workers add CPU parallelism
+# for query embedding and search.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Load app.backend.wsgi (index, model) once in the master before forking.
+preload_app = True
+# Above LLM_TIMEOUT so a slow answer isn't killed as a hung worker.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
+graceful_timeout = 30
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    # Threads don't survive fork, so the keep-warm pinger is started in each
+    # worker rather than at import time in the preloading master.
+    from app.backend.llms import start_keep_warm
+
+    start_keep_warm()
@@ -1,22 +1,27 @@
 from __future__ import annotations
 
-import json
+import argparse
+import re
 import shutil
+import subprocess
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import List
-
-import pdfplumber
+from typing import AbstractSet, Iterator, List, Sequence, Tuple
 
 from .config import (
     CHUNK_OVERLAP,
     CHUNK_SIZE,
     CHUNKS_DIR,
-    INDEX_DIR,
     MIN_PAGE_TEXT_LEN,
+    PAGE_CACHE_ENABLED,
     PDF_DIR,
+    PDF_EXTRACTOR,
 )
-from .embeddings import get_embedder
-from .vectorstores import get_vector_store
+from .extractors import ExtractionStats, PageTextExtractor, get_page_extractor, page_count
+from .metrics import record_cache
+from .pagecache import PageTextCache, file_sha256
+from .vectorstores import INDEX_ID, validate_index_name
 
 try:
     import pytesseract
@@ -32,19 +37,50 @@ def normalize_text(text: str) -> str:
     return text.strip()
 
 
-def page_text_with_ocr(pdf_path: Path, page_index: int) -> str:
+# pdf2image's and pytesseract's defaults; part of the OCR cache key.
+OCR_DPI = 200
+OCR_LANG = "eng"
+
+
+def page_text_with_ocr(pdf_path: Path, page_index: int) -> str | None:
+    # None means OCR could not run (missing tools, rendering or tesseract error),
+    # as opposed to "" for a page OCR read but found no text on.
     if pytesseract is None or convert_from_path is None or shutil.which("tesseract") is None:
-        return ""
+        return None
     try:
-        images = convert_from_path(str(pdf_path), first_page=page_index + 1, last_page=page_index + 1)
+        images = convert_from_path(
+            str(pdf_path), dpi=OCR_DPI, first_page=page_index + 1, last_page=page_index + 1
+        )
     except Exception:
-        return ""
+        return None
     if not images:
-        return ""
+        return None
     try:
-        return pytesseract.image_to_string(images[0])
+        return pytesseract.image_to_string(images[0], lang=OCR_LANG)
     except Exception:
-        return ""
+        return None
+
+
+def _poppler_version() -> str:
+    try:
+        result = subprocess.run(["pdftoppm", "-v"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+    match = re.search(r"version (\S+)", result.stderr + result.stdout)
+    return match.group(1) if match else "unknown"
+
+
+@lru_cache(maxsize=1)
+def ocr_cache_key() -> str | None:
+    # None when OCR can't run at all. Updated traineddata files for the same
+    # tesseract version and language are not detected; clear the cache after one.
+    if pytesseract is None or convert_from_path is None or shutil.which("tesseract") is None:
+        return None
+    try:
+        tesseract = pytesseract.get_tesseract_version()
+    except Exception:
+        return None
+    return f"ocr-tesseract-{tesseract}-poppler-{_poppler_version()}-{OCR_LANG}-{OCR_DPI}dpi"
 
 
 def split_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
@@ -70,55 +106,155 @@ def split_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
     return chunks
 
 
-def ingest_pdf(pdf_path: Path) -> List[dict]:
-    results: List[dict] = []
-    with pdfplumber.open(str(pdf_path)) as pdf:
-        for i, page in enumerate(pdf.pages):
-            text = page.extract_text() or ""
-            text = normalize_text(text)
-            if len(text) < MIN_PAGE_TEXT_LEN:
+def iter_page_texts(
+    pdf_path: Path,
+    extractor: PageTextExtractor,
+    stats: ExtractionStats | None = None,
+    skip_pages: AbstractSet[int] = frozenset(),
+    cache: PageTextCache | None = None,
+) -> Iterator[Tuple[int, str]]:
+    if cache is None:
+        for page in extractor.extract_pages(pdf_path, stats, skip_pages):
+            yield page.index, page.text
+        return
+    start = time.perf_counter()
+    cached = cache.pages()
+    pages = [i for i in range(page_count(pdf_path)) if i not in skip_pages]
+    hits = sum(1 for i in pages if i in cached)
+    if stats is not None and hits:
+        stats.add("cache", time.perf_counter() - start, hits)
+    # The extractor only opens the PDF when some page is missing from the cache.
+    fresh = iter(())
+    if hits < len(pages):
+        fresh = extractor.extract_pages(pdf_path, stats, skip_pages | cached.keys())
+    pending = next(fresh, None)
+    for i in pages:
+        text = cached.get(i)
+        record_cache("page_text", text is not None)
+        if text is None:
+            if pending is None or pending.index != i:
+                raise RuntimeError(f"{pdf_path.name}: extractor returned no text for page {i + 1}")
+            text = pending.text
+            cache.put(i, text)
+            pending = next(fresh, None)
+        yield i, text
+
+
+def iter_page_chunks(
+    pdf_path: Path,
+    extractor: PageTextExtractor | None = None,
+    stats: ExtractionStats | None = None,
+    skip_pages: AbstractSet[int] = frozenset(),
+    use_cache: bool = PAGE_CACHE_ENABLED,
+) -> Iterator[Tuple[int, List[dict]]]:
+    # Yields every page, including ones without text, so callers can checkpoint per page.
+    extractor = extractor or get_page_extractor()
+    text_cache = ocr_cache = None
+    if use_cache:
+        pdf_sha256 = file_sha256(pdf_path)
+        text_cache = PageTextCache(pdf_sha256, extractor.cache_key)
+        ocr_key = ocr_cache_key()
+        ocr_cache = PageTextCache(pdf_sha256, ocr_key) if ocr_key else None
+    for i, raw_text in iter_page_texts(pdf_path, extractor, stats, skip_pages, text_cache):
+        text = normalize_text(raw_text)
+        if len(text) < MIN_PAGE_TEXT_LEN:
+            ocr_text = ocr_cache.get(i) if ocr_cache is not None else None
+            if ocr_cache is not None:
+                record_cache("page_ocr", ocr_text is not None)
+            if ocr_text is None:
+                start = time.perf_counter()
                 ocr_text = page_text_with_ocr(pdf_path, i)
-                ocr_text = normalize_text(ocr_text)
-                if len(ocr_text) > len(text):
-                    text = ocr_text
-            if not text:
-                continue
-            chunks = split_chunks(text, CHUNK_SIZE, CHUNK_OVERLAP)
-            for j, chunk in enumerate(chunks):
-                results.append(
-                    {
-                        "chunk_id": f"{pdf_path.stem}-p{i+1}-c{j+1}",
-                        "text": chunk,
-                        "source": str(pdf_path),
-                        "page": i + 1,
-                        "title": pdf_path.stem,
-                    }
-                )
-    return results
-
-
-def main() -> None:
-    CHUNKS_DIR.mkdir(parents=True, exist_ok=True)
-    INDEX_DIR.mkdir(parents=True, exist_ok=True)
-
-    all_chunks: List[dict] = []
-    pdfs = sorted(PDF_DIR.glob("*.pdf"))
-    for pdf in pdfs:
-        chunks = ingest_pdf(pdf)
-        chunk_path = CHUNKS_DIR / f"{pdf.stem}.jsonl"
-        with chunk_path.open("w", encoding="utf-8") as f:
-            for c in chunks:
-                f.write(json.dumps(c, ensure_ascii=False) + "\n")
-        all_chunks.extend(chunks)
-
-    if not all_chunks:
-        raise SystemExit("No chunks created. Check PDFs or OCR settings.")
-
-    embedder = get_embedder()
-    vector_store = get_vector_store()
-    vector_store.save(all_chunks, embedder, show_progress_bar=True)
-
-    print(f"Ingested {len(all_chunks)} chunks from {len(pdfs)} PDFs.")
+                if stats is not None:
+                    stats.add("ocr", time.perf_counter() - start)
+                # Failed OCR is not cached, so it is retried once the tools work.
+                if ocr_cache is not None and ocr_text is not None:
+                    ocr_cache.put(i, ocr_text)
+            ocr_text = normalize_text(ocr_text or "")
+            if len(ocr_text) > len(text):
+                text = ocr_text
+        results: List[dict] = []
+        for j, chunk in enumerate(split_chunks(text, CHUNK_SIZE, CHUNK_OVERLAP)):
+            results.append(
+                {
+                    "chunk_id": f"{pdf_path.stem}-p{i+1}-c{j+1}",
+                    "text": chunk,
+                    "source": str(pdf_path),
+                    "page": i + 1,
+                    "title": pdf_path.stem,
+                }
+            )
+        yield i, results
+
+
+def ingest_pdf(
+    pdf_path: Path,
+    extractor: PageTextExtractor | None = None,
+    stats: ExtractionStats | None = None,
+) -> List[dict]:
+    return [chunk for _, chunks in iter_page_chunks(pdf_path, extractor, stats) for chunk in chunks]
+
+
+def chunks_dir_for(index: str = INDEX_ID) -> Path:
+    index = validate_index_name(index)
+    return CHUNKS_DIR if index == INDEX_ID else CHUNKS_DIR / index
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    from .jobs import IngestJob, JobConflictError
+
+    parser = argparse.ArgumentParser(description="Extract, chunk and embed PDFs into a vector index.")
+    parser.add_argument("--index", default=INDEX_ID, help="name of the index to build (default: %(default)s)")
+    parser.add_argument("--pdf-dir", type=Path, default=PDF_DIR, help="folder of PDFs to ingest")
+    parser.add_argument(
+        "--extractor",
+        choices=["hybrid", "pdfium", "pdfplumber"],
+        default=PDF_EXTRACTOR,
+        help="page text extraction backend (default: %(default)s)",
+    )
+    parser.add_argument("--resume", metavar="JOB_ID", default="", help="resume this ingest job")
+    parser.add_argument("--restart", action="store_true", help="start a new job instead of resuming an unfinished one")
+    args = parser.parse_args(argv)
+    try:
+        index = validate_index_name(args.index)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    try:
+        if args.resume:
+            job = IngestJob.load(args.resume)
+        else:
+            job = None if args.restart else IngestJob.find_resumable(index, args.pdf_dir, args.extractor)
+            if job is None:
+                running = IngestJob.running(index)
+                if running is not None:
+                    raise JobConflictError(f"Ingest job {running.id} is already running for index '{index}'")
+                job = IngestJob.create(index, args.pdf_dir, args.extractor)
+            else:
+                print(f"Resuming ingest job {job.id} ({len(job.state['completed_pdfs'])} PDFs done).")
+    except (FileNotFoundError, ValueError, JobConflictError) as exc:
+        raise SystemExit(str(exc)) from None
+    try:
+        state = job.run(log=print)
+    except (ValueError, JobConflictError) as exc:
+        raise SystemExit(str(exc)) from None
+    except BaseException:
+        print(f"Ingest job {job.id} stopped; run ingest again to resume from its last checkpoint.")
+        raise
+
+    extraction = ExtractionStats()
+    for backend, seconds in state["extraction"]["seconds"].items():
+        extraction.add(backend, seconds, state["extraction"]["pages"].get(backend, 0))
+    if extraction.seconds:
+        print(f"Page text extraction ({state['extractor']}): {extraction.summary()}")
+    result = state["result"]
+    print(f"Ingested {result['chunks']} chunks from {len(state['pdfs'])} PDFs into index '{index}' (job {job.id}).")
+    shared = result.get("shared_vectors", 0)
+    if result["duplicates"] or shared:
+        print(
+            f"Skipped {result['duplicates']} duplicate chunks and reused {shared} vectors for copies in other PDFs; "
+            f"saved {result['duplicates'] + shared} embeddings. "
+            f"Provenance: {chunks_dir_for(index) / '_duplicates.jsonl'}"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,481 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from .config import DEDUP_ENABLED, INGEST_CHECKPOINT_CHUNKS, JOBS_DIR, PDF_DIR, PDF_EXTRACTOR
+from .dedup import dedup_chunks, expand_shared_vectors, rows_to_embed
+from .embeddings import Embedder, get_default_embedder
+from .extractors import ExtractionStats, get_page_extractor, page_count
+from .ingest import chunks_dir_for, iter_page_chunks
+from .vectorstores import INDEX_ID, get_vector_store, validate_index_name
+
+logger = logging.getLogger(__name__)
+
+_JOB_ID_RE = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{6}$")
+
+# On Windows a job started by another process can't be probed by pid, so it
+# counts as alive while it has saved progress this recently.
+_STALE_SECONDS = 600
+
+# Jobs running in this process, by id.
+_active: Dict[str, "IngestJob"] = {}
+_active_lock = threading.Lock()
+
+Log = Callable[[str], None]
+
+
+class JobConflictError(RuntimeError):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _pdf_fingerprints(pdf_dir: Path) -> List[dict]:
+    return [
+        {"name": pdf.name, "size": pdf.stat().st_size, "mtime": int(pdf.stat().st_mtime)}
+        for pdf in sorted(pdf_dir.glob("*.pdf"))
+    ]
+
+
+def _chunks_digest(chunks: Sequence[dict]) -> str:
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk["chunk_id"].encode("utf-8"))
+        digest.update(hashlib.sha256(chunk["text"].encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def _read_pages(path: Path) -> Dict[int, List[dict]]:
+    # A kill can leave the last line half-written; keep the complete lines and
+    # rewrite the file so appends continue from a clean line boundary.
+    pages: Dict[int, List[dict]] = {}
+    if not path.exists():
+        return pages
+    lines = path.read_text(encoding="utf-8").splitlines()
+    valid: List[str] = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        pages[int(record["page"])] = record["chunks"]
+        valid.append(line)
+    if len(valid) != len(lines) or (lines and not path.read_bytes().endswith(b"\n")):
+        path.write_text("".join(line + "\n" for line in valid), encoding="utf-8")
+    return pages
+
+
+class IngestJob:
+    def __init__(self, job_dir: Path, state: dict):
+        self.job_dir = job_dir
+        self.state = state
+        self.pages_dir = job_dir / "pages"
+        self.embeddings_dir = job_dir / "embeddings"
+        # status() reads the state as of the last save, so request threads never see
+        # the worker thread's half-updated dicts.
+        self._snapshot = json.dumps(state, ensure_ascii=False)
+        self._last_save = 0.0
+        self._phase_clock = 0.0
+        self._phase_base = 0
+
+    @property
+    def id(self) -> str:
+        return self.state["id"]
+
+    @property
+    def index(self) -> str:
+        return self.state["index"]
+
+    @classmethod
+    def create(
+        cls,
+        index: str = INDEX_ID,
+        pdf_dir: Path = PDF_DIR,
+        extractor: str = PDF_EXTRACTOR,
+        jobs_dir: Path = JOBS_DIR,
+    ) -> "IngestJob":
+        index = validate_index_name(index)
+        get_page_extractor(extractor)
+        pdf_dir = Path(pdf_dir).resolve()
+        pdfs = _pdf_fingerprints(pdf_dir)
+        if not pdfs:
+            raise FileNotFoundError(f"No PDFs found in {pdf_dir}")
+        for info in pdfs:
+            try:
+                info["pages"] = page_count(pdf_dir / info["name"])
+            except Exception:
+                info["pages"] = None
+        job_id = f"{datetime.now(timezone.utc):%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        state = {
+            "id": job_id,
+            "index": index,
+            "pdf_dir": str(pdf_dir),
+            "extractor": extractor.lower(),
+            "status": "queued",
+            "pid": None,
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "updated_ts": time.time(),
+            "runs": 0,
+            "error": None,
+            "pdfs": pdfs,
+            "completed_pdfs": [],
+            "embedder": None,
+            "chunks_digest": None,
+            "progress": {"phase": "queued", "unit": "pages", "done": 0, "total": 0},
+            "extraction": {"seconds": {}, "pages": {}},
+            "result": None,
+        }
+        job = cls(jobs_dir / job_id, state)
+        job.job_dir.mkdir(parents=True, exist_ok=True)
+        job.save(force=True)
+        return job
+
+    @classmethod
+    def load(cls, job_id: str, jobs_dir: Path = JOBS_DIR) -> "IngestJob":
+        with _active_lock:
+            if job_id in _active:
+                return _active[job_id]
+        path = jobs_dir / str(job_id) / "job.json"
+        if not _JOB_ID_RE.match(str(job_id)) or not path.exists():
+            raise FileNotFoundError(f"Ingest job '{job_id}' not found")
+        return cls(path.parent, json.loads(path.read_text(encoding="utf-8")))
+
+    @classmethod
+    def running(cls, index: str, jobs_dir: Path = JOBS_DIR) -> "IngestJob | None":
+        for job in list_jobs(jobs_dir):
+            if job.index == index and job.status()["status"] == "running":
+                return job
+        return None
+
+    @classmethod
+    def find_resumable(
+        cls,
+        index: str = INDEX_ID,
+        pdf_dir: Path = PDF_DIR,
+        extractor: str = PDF_EXTRACTOR,
+        jobs_dir: Path = JOBS_DIR,
+    ) -> "IngestJob | None":
+        pdf_dir = Path(pdf_dir).resolve()
+        for job in list_jobs(jobs_dir):
+            state = job.state
+            if (
+                state["index"] == index
+                and state["pdf_dir"] == str(pdf_dir)
+                and state["extractor"] == extractor.lower()
+                and job.status()["status"] in {"queued", "failed", "interrupted"}
+                and job.pdfs_unchanged()
+            ):
+                return job
+        return None
+
+    def pdfs_unchanged(self) -> bool:
+        current = _pdf_fingerprints(Path(self.state["pdf_dir"]))
+        recorded = [{k: info[k] for k in ("name", "size", "mtime")} for info in self.state["pdfs"]]
+        return current == recorded
+
+    def status(self) -> dict:
+        state = json.loads(self._snapshot)
+        if state["status"] == "running" and not self._owner_alive():
+            state["status"] = "interrupted"
+        return state
+
+    def summary(self) -> dict:
+        state = self.status()
+        return {
+            "id": state["id"],
+            "index": state["index"],
+            "status": state["status"],
+            "extractor": state["extractor"],
+            "created_at": state["created_at"],
+            "started_at": state["started_at"],
+            "finished_at": state["finished_at"],
+            "runs": state["runs"],
+            "error": state["error"],
+            "pdfs": {"done": len(state["completed_pdfs"]), "total": len(state["pdfs"])},
+            "progress": state["progress"],
+            "extraction_seconds": state["extraction"]["seconds"],
+            "result": state["result"],
+        }
+
+    def _owner_alive(self) -> bool:
+        pid = self.state.get("pid")
+        if not pid:
+            return False
+        if pid == os.getpid():
+            with _active_lock:
+                return self.id in _active
+        if os.name == "nt":
+            # os.kill(pid, 0) would terminate the process on Windows.
+            return time.time() - self.state.get("updated_ts", 0) < _STALE_SECONDS
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def save(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_save < 1.0:
+            return
+        self._last_save = now
+        self.state["updated_ts"] = time.time()
+        self._snapshot = json.dumps(self.state, ensure_ascii=False, indent=2)
+        tmp = self.job_dir / "job.json.tmp"
+        tmp.write_text(self._snapshot, encoding="utf-8")
+        os.replace(tmp, self.job_dir / "job.json")
+
+    def run(self, log: Log = logger.info, on_complete: Callable[["IngestJob"], None] | None = None) -> dict:
+        status = self.status()["status"]
+        with _active_lock:
+            if self.id in _active:
+                status = "running"
+        if status == "completed":
+            return self.status()
+        if status == "running":
+            raise JobConflictError(f"Ingest job {self.id} is already running (pid {self.state['pid']})")
+        if not self.pdfs_unchanged():
+            raise ValueError(f"PDFs in {self.state['pdf_dir']} changed since job {self.id} started; start a new job")
+
+        with _active_lock:
+            _active[self.id] = self
+        self.state.update(status="running", pid=os.getpid(), error=None, runs=self.state["runs"] + 1)
+        self.state["started_at"] = self.state["started_at"] or _now()
+        self.save(force=True)
+        try:
+            chunks = self._extract(log)
+            if not chunks:
+                raise ValueError("No chunks created. Check PDFs or OCR settings.")
+            duplicates: List[dict] = []
+            if DEDUP_ENABLED:
+                chunks, duplicates = dedup_chunks(chunks)
+            # Shares the model the server already loaded for queries.
+            embedder = get_default_embedder()
+            unique = rows_to_embed(chunks)
+            embeddings = expand_shared_vectors(chunks, self._embed(unique, embedder, log))
+            self._write(chunks, duplicates, embeddings, embedder)
+        except BaseException as exc:
+            # KeyboardInterrupt and SystemExit leave the job resumable as well.
+            failed = isinstance(exc, Exception)
+            self.state["status"] = "failed" if failed else "interrupted"
+            self.state["error"] = str(exc) if failed else None
+            self.save(force=True)
+            raise
+        finally:
+            with _active_lock:
+                _active.pop(self.id, None)
+
+        self.state["status"] = "completed"
+        self.state["finished_at"] = _now()
+        self.state["result"] = {
+            "chunks": len(chunks),
+            "duplicates": len(duplicates),
+            "shared_vectors": len(chunks) - len(unique),
+        }
+        self._start_phase("done", "chunks", len(chunks), len(chunks))
+        self.save(force=True)
+        # Checkpoints are only needed to resume; the index now holds the result.
+        shutil.rmtree(self.pages_dir, ignore_errors=True)
+        shutil.rmtree(self.embeddings_dir, ignore_errors=True)
+        if on_complete is not None:
+            on_complete(self)
+        return self.status()
+
+    def _start_phase(self, phase: str, unit: str, total: int, done: int = 0) -> None:
+        self.state["progress"] = {
+            "phase": phase,
+            "unit": unit,
+            "done": done,
+            "total": total,
+            "percent": round(100 * done / total, 1) if total else None,
+            "per_second": None,
+            "eta_seconds": None,
+        }
+        self._phase_clock = time.monotonic()
+        self._phase_base = done
+
+    def _advance(self, amount: int) -> None:
+        progress = self.state["progress"]
+        progress["done"] += amount
+        total = progress["total"]
+        # Throughput counts only work done in this run, so resumed work doesn't inflate it.
+        elapsed = time.monotonic() - self._phase_clock
+        processed = progress["done"] - self._phase_base
+        if total:
+            progress["percent"] = round(100 * progress["done"] / total, 1)
+        if elapsed > 0 and processed > 0:
+            rate = processed / elapsed
+            progress["per_second"] = round(rate, 2)
+            progress["eta_seconds"] = round(max(0, total - progress["done"]) / rate, 1) if total else None
+        self.save()
+
+    def _extract(self, log: Log) -> List[dict]:
+        self.pages_dir.mkdir(parents=True, exist_ok=True)
+        extractor = get_page_extractor(self.state["extractor"])
+        pdf_dir = Path(self.state["pdf_dir"])
+        chunks_dir = chunks_dir_for(self.index)
+        chunks_dir.mkdir(parents=True, exist_ok=True)
+        total_pages = sum(info.get("pages") or 0 for info in self.state["pdfs"])
+        self._start_phase("extract", "pages", total_pages)
+
+        all_chunks: List[dict] = []
+        for n, info in enumerate(self.state["pdfs"], start=1):
+            pdf = pdf_dir / info["name"]
+            pages_path = self.pages_dir / f"{pdf.stem}.jsonl"
+            pages = _read_pages(pages_path)
+            self.state["progress"]["done"] += len(pages)
+            self._phase_base += len(pages)
+            if info["name"] not in self.state["completed_pdfs"]:
+                if pages:
+                    log(f"[{n}/{len(self.state['pdfs'])}] {pdf.name}: resuming after {len(pages)} pages")
+                stats = ExtractionStats()
+                with pages_path.open("a", encoding="utf-8") as f:
+                    for i, page_chunks in iter_page_chunks(pdf, extractor, stats, skip_pages=frozenset(pages)):
+                        f.write(json.dumps({"page": i, "chunks": page_chunks}, ensure_ascii=False) + "\n")
+                        f.flush()
+                        pages[i] = page_chunks
+                        self._advance(1)
+                chunks = [chunk for i in sorted(pages) for chunk in pages[i]]
+                with (chunks_dir / f"{pdf.stem}.jsonl").open("w", encoding="utf-8") as f:
+                    for c in chunks:
+                        f.write(json.dumps(c, ensure_ascii=False) + "\n")
+                extraction = self.state["extraction"]
+                for backend, seconds in stats.seconds.items():
+                    extraction["seconds"][backend] = extraction["seconds"].get(backend, 0.0) + seconds
+                    extraction["pages"][backend] = extraction["pages"].get(backend, 0) + stats.pages[backend]
+                self.state["completed_pdfs"].append(info["name"])
+                self.save(force=True)
+                log(f"[{n}/{len(self.state['pdfs'])}] {pdf.name}: {len(pages)} pages, {len(chunks)} chunks")
+            all_chunks.extend(chunk for i in sorted(pages) for chunk in pages[i])
+        return all_chunks
+
+    def _embed(self, chunks: Sequence[dict], embedder: Embedder, log: Log) -> np.ndarray:
+        # Batches are only reused for the same embedding model and the same chunks.
+        key = {"provider": embedder.provider, "model": embedder.model}
+        digest = _chunks_digest(chunks)
+        if self.state["embedder"] != key or self.state["chunks_digest"] != digest:
+            shutil.rmtree(self.embeddings_dir, ignore_errors=True)
+            self.state["embedder"] = key
+            self.state["chunks_digest"] = digest
+        self.embeddings_dir.mkdir(parents=True, exist_ok=True)
+
+        size = max(1, INGEST_CHECKPOINT_CHUNKS)
+        texts = [chunk["text"] for chunk in chunks]
+        self._start_phase("embed", "chunks", len(texts))
+        self.save(force=True)
+        batches: List[np.ndarray] = []
+        resumed = 0
+        for start in range(0, len(texts), size):
+            batch = texts[start : start + size]
+            path = self.embeddings_dir / f"batch-{start // size:05d}.npy"
+            vectors = None
+            if path.exists():
+                try:
+                    vectors = np.load(path)
+                except (OSError, ValueError):
+                    vectors = None
+                if vectors is not None and vectors.shape[0] != len(batch):
+                    vectors = None
+            if vectors is None:
+                vectors = np.asarray(embedder.embed_texts(batch), dtype=np.float32)
+                tmp = path.with_suffix(".tmp")
+                with tmp.open("wb") as f:
+                    np.save(f, vectors)
+                os.replace(tmp, path)
+                self._advance(len(batch))
+            else:
+                resumed += len(batch)
+                self.state["progress"]["done"] += len(batch)
+                self._phase_base += len(batch)
+            batches.append(vectors)
+        if resumed:
+            log(f"Reused {resumed} embeddings from checkpoints")
+        return np.concatenate(batches, axis=0)
+
+    def _write(self, chunks: Sequence[dict], duplicates: Sequence[dict], embeddings: np.ndarray, embedder: Embedder) -> None:
+        self._start_phase("write", "chunks", len(chunks))
+        self.save(force=True)
+        chunks_dir = chunks_dir_for(self.index)
+        with (chunks_dir / "_duplicates.jsonl").open("w", encoding="utf-8") as f:
+            for d in duplicates:
+                f.write(json.dumps(d, ensure_ascii=False) + "\n")
+        get_vector_store(index=self.index).write(chunks, embeddings, embedder)
+
+
+def list_jobs(jobs_dir: Path = JOBS_DIR) -> List[IngestJob]:
+    if not jobs_dir.exists():
+        return []
+    return [
+        IngestJob.load(path.name, jobs_dir)
+        for path in sorted(jobs_dir.iterdir(), reverse=True)
+        if _JOB_ID_RE.match(path.name) and (path / "job.json").exists()
+    ]
+
+
+class IngestJobRunner:
+    def __init__(self, on_complete: Callable[[IngestJob], None] | None = None, jobs_dir: Path = JOBS_DIR):
+        self.on_complete = on_complete
+        self.jobs_dir = jobs_dir
+        self._threads: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        index: str = INDEX_ID,
+        pdf_dir: Path = PDF_DIR,
+        extractor: str = PDF_EXTRACTOR,
+        resume: bool = True,
+    ) -> IngestJob:
+        index = validate_index_name(index)
+        with self._lock:
+            self._check_idle(index)
+            job = IngestJob.find_resumable(index, pdf_dir, extractor, self.jobs_dir) if resume else None
+            if job is None:
+                job = IngestJob.create(index, pdf_dir, extractor, self.jobs_dir)
+            self._launch(job)
+        return job
+
+    def resume(self, job_id: str) -> IngestJob:
+        job = IngestJob.load(job_id, self.jobs_dir)
+        with self._lock:
+            self._check_idle(job.index)
+            status = job.status()["status"]
+            if status not in {"queued", "failed", "interrupted"}:
+                raise JobConflictError(f"Ingest job {job.id} is {status}")
+            self._launch(job)
+        return job
+
+    def _check_idle(self, index: str) -> None:
+        thread = self._threads.get(index)
+        running = IngestJob.running(index, self.jobs_dir)
+        if (thread is not None and thread.is_alive()) or running is not None:
+            raise JobConflictError(f"An ingest job is already running for index '{index}'")
+
+    def _launch(self, job: IngestJob) -> None:
+        thread = threading.Thread(target=self._run, args=(job,), name=f"ingest-{job.id}", daemon=True)
+        self._threads[job.index] = thread
+        thread.start()
+
+    def _run(self, job: IngestJob) -> None:
+        try:
+            job.run(log=lambda message: logger.info("ingest %s: %s", job.id, message), on_complete=self.on_complete)
+        except Exception:
+            logger.exception("Ingest job %s failed", job.id)
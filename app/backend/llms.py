@@ -1,11 +1,56 @@
 from __future__ import annotations
 
 import json
-from typing import Protocol
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Protocol, Sequence
 
 import requests
 
-from .config import LLM_PROVIDER, OLLAMA_BASE_URL, OLLAMA_MODEL, REMOTE_API_KEY, REMOTE_BASE_URL, REMOTE_MODEL
+from .config import (
+    LLM_BREAKER_COOLDOWN,
+    LLM_BREAKER_FAILURES,
+    LLM_DEADLINES,
+    LLM_HEDGE,
+    LLM_HEDGE_DELAY,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_POOL_SIZE,
+    LLM_KEEP_ALIVE,
+    LLM_KEEP_WARM_INTERVAL,
+    LLM_MAX_OUTPUT_TOKENS,
+    LLM_NUM_CTX,
+    LLM_PROVIDER,
+    LLM_PROVIDERS,
+    LLM_TIMEOUT,
+    MAX_CONTEXT_TOKENS,
+    OLLAMA_BASE_URL,
+    OLLAMA_MODEL,
+    REMOTE_API_KEY,
+    REMOTE_BASE_URL,
+    REMOTE_MODEL,
+)
+from .metrics import LLM_CIRCUIT_OPEN, LLM_HEDGE_POOL_FULL, LLM_HEDGES, LLM_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Tokens reserved for the system prompt, instructions and question around the context.
+PROMPT_OVERHEAD_TOKENS = 1024
+
+
+def context_window_size(
+    num_ctx: int = LLM_NUM_CTX,
+    max_context_tokens: int = MAX_CONTEXT_TOKENS,
+    max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS,
+) -> int:
+    # Ollama reloads the model whenever num_ctx changes, so the window is derived
+    # once from the configured budgets instead of from each prompt.
+    if num_ctx > 0:
+        return num_ctx
+    needed = max_context_tokens + PROMPT_OVERHEAD_TOKENS + max(0, max_output_tokens)
+    return -(-needed // 1024) * 1024
 
 
 class LLMClient(Protocol):
@@ -19,9 +64,27 @@ class LLMClient(Protocol):
 class OllamaClient:
     provider = "ollama"
 
-    def __init__(self, base_url: str = OLLAMA_BASE_URL, model: str = OLLAMA_MODEL):
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        model: str = OLLAMA_MODEL,
+        keep_alive: str = LLM_KEEP_ALIVE,
+        max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS,
+        num_ctx: int = LLM_NUM_CTX,
+        timeout: float = LLM_TIMEOUT,
+    ):
         self.base_url = base_url.rstrip("/")
         self.model = model
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.max_output_tokens = max_output_tokens
+        self.num_ctx = context_window_size(num_ctx, max_output_tokens=max_output_tokens)
+
+    def _options(self) -> dict:
+        options: dict = {"num_ctx": self.num_ctx}
+        if self.max_output_tokens > 0:
+            options["num_predict"] = self.max_output_tokens
+        return options
 
     def chat(self, system: str, prompt: str) -> str:
         payload = {
@@ -31,12 +94,24 @@ class OllamaClient:
                 {"role": "user", "content": prompt},
             ],
             "stream": False,
+            "options": self._options(),
         }
-        response = requests.post(self.base_url + "/api/chat", json=payload, timeout=120)
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        response = requests.post(self.base_url + "/api/chat", json=payload, timeout=self.timeout)
         response.raise_for_status()
         data = response.json()
         return data.get("message", {}).get("content", "")
 
+    def warm(self) -> None:
+        # A generate request without a prompt only loads the model. It must use the
+        # same num_ctx as chat, otherwise the next chat reloads the model anyway.
+        payload = {"model": self.model, "options": self._options()}
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        response = requests.post(self.base_url + "/api/generate", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+
 
 class OpenAICompatibleClient:
     provider = "remote"
@@ -46,10 +121,14 @@ class OpenAICompatibleClient:
         base_url: str = REMOTE_BASE_URL,
         model: str = REMOTE_MODEL,
         api_key: str = REMOTE_API_KEY,
+        max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS,
+        timeout: float = LLM_TIMEOUT,
     ):
         self.base_url = base_url.rstrip("/")
         self.model = model
         self.api_key = api_key
+        self.timeout = timeout
+        self.max_output_tokens = max_output_tokens
 
     def chat(self, system: str, prompt: str) -> str:
         headers = {"Content-Type": "application/json"}
@@ -63,21 +142,226 @@ class OpenAICompatibleClient:
             ],
             "temperature": 0.2,
         }
+        if self.max_output_tokens > 0:
+            payload["max_tokens"] = self.max_output_tokens
         response = requests.post(
             self.base_url + "/chat/completions",
             headers=headers,
             data=json.dumps(payload),
-            timeout=120,
+            timeout=self.timeout,
         )
         response.raise_for_status()
         data = response.json()
         return data["choices"][0]["message"]["content"]
 
 
-def get_llm_client(provider: str = LLM_PROVIDER) -> LLMClient:
+def get_llm_client(provider: str = LLM_PROVIDER, timeout: float | None = None) -> LLMClient:
     provider = provider.lower()
+    if timeout is None:
+        timeout = LLM_DEADLINES.get(provider, LLM_TIMEOUT)
     if provider == "ollama":
-        return OllamaClient()
+        return OllamaClient(timeout=timeout)
     if provider == "remote":
-        return OpenAICompatibleClient()
+        return OpenAICompatibleClient(timeout=timeout)
     raise RuntimeError(f"Unsupported LLM provider: {provider}")
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        # After the cooldown one trial request is let through (half-open); its
+        # result decides whether the breaker closes or stays open.
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_in_flight or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+        LLM_CIRCUIT_OPEN.set(0, provider=self.name)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+            is_open = self.opened_at is not None
+        if is_open:
+            LLM_CIRCUIT_OPEN.set(1, provider=self.name)
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self._samples: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 1) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class LLMRouter:
+    provider = "router"
+
+    def __init__(
+        self,
+        clients: Sequence[LLMClient],
+        hedge: bool = LLM_HEDGE,
+        hedge_delay: float = LLM_HEDGE_DELAY,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        failure_threshold: int = LLM_BREAKER_FAILURES,
+        cooldown: float = LLM_BREAKER_COOLDOWN,
+        pool_size: int = LLM_HEDGE_POOL_SIZE,
+    ):
+        if not clients:
+            raise RuntimeError("At least one LLM provider is required")
+        self.clients = list(clients)
+        self.model = ",".join(f"{c.provider}:{c.model}" for c in self.clients)
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.breakers = {c.provider: CircuitBreaker(c.provider, failure_threshold, cooldown) for c in self.clients}
+        self.latencies = {c.provider: LatencyWindow() for c in self.clients}
+        # Hedged requests that lose the race keep running here until their deadline.
+        # A call only gets a pool thread when a slot is free, so calls never queue
+        # behind other requests' calls.
+        pool_size = max(1, pool_size)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="llm")
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def chat(self, system: str, prompt: str) -> str:
+        if self.hedge and len(self.clients) > 1:
+            return self._chat_hedged(system, prompt)
+        return self._chat_sequential(system, prompt, list(self.clients), [])
+
+    def _chat_sequential(self, system: str, prompt: str, clients: Sequence[LLMClient], errors: list[str]) -> str:
+        for client in clients:
+            if not self.breakers[client.provider].allow():
+                LLM_REQUESTS.inc(provider=client.provider, result="skipped")
+                errors.append(f"{client.provider}: circuit open")
+                continue
+            try:
+                return self._call(client, system, prompt)
+            except Exception as exc:
+                errors.append(f"{client.provider}: {exc}")
+        raise RuntimeError("All LLM providers failed: " + "; ".join(errors))
+
+    def _chat_hedged(self, system: str, prompt: str) -> str:
+        waiting = list(self.clients)
+        pending: dict[Future, LLMClient] = {}
+        errors: list[str] = []
+
+        def launch_next() -> LLMClient | None:
+            if not waiting:
+                return None
+            if not self._slots.acquire(blocking=False):
+                LLM_HEDGE_POOL_FULL.inc()
+                return None
+            while waiting:
+                client = waiting.pop(0)
+                if self.breakers[client.provider].allow():
+                    future = self._executor.submit(self._call, client, system, prompt)
+                    future.add_done_callback(lambda _: self._slots.release())
+                    pending[future] = client
+                    return client
+                LLM_REQUESTS.inc(provider=client.provider, result="skipped")
+                errors.append(f"{client.provider}: circuit open")
+            self._slots.release()
+            return None
+
+        primary = launch_next()
+        timeout = self._hedge_after(primary) if primary is not None else None
+        while pending:
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            timeout = None
+            if not done:
+                # The primary is slower than its usual p95: race a backup against it.
+                if launch_next() is not None:
+                    LLM_HEDGES.inc()
+                continue
+            for future in done:
+                client = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as exc:
+                    errors.append(f"{client.provider}: {exc}")
+            if not pending:
+                launch_next()
+        # Providers the pool had no room for are tried on the request thread.
+        return self._chat_sequential(system, prompt, waiting, errors)
+
+    def _hedge_after(self, client: LLMClient) -> float:
+        p95 = self.latencies[client.provider].percentile(95, self.hedge_min_samples)
+        return p95 if p95 is not None else self.hedge_delay
+
+    def _call(self, client: LLMClient, system: str, prompt: str) -> str:
+        breaker = self.breakers[client.provider]
+        start = time.perf_counter()
+        try:
+            answer = client.chat(system, prompt)
+        except Exception:
+            breaker.record_failure()
+            LLM_REQUESTS.inc(provider=client.provider, result="error")
+            raise
+        breaker.record_success()
+        self.latencies[client.provider].add(time.perf_counter() - start)
+        LLM_REQUESTS.inc(provider=client.provider, result="success")
+        return answer
+
+
+_router: LLMRouter | None = None
+_router_lock = threading.Lock()
+
+
+def get_llm_router(providers: Sequence[str] = LLM_PROVIDERS) -> LLMRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter([get_llm_client(provider) for provider in providers])
+        return _router
+
+
+_keep_warm_thread: threading.Thread | None = None
+
+
+def start_keep_warm(interval: float = LLM_KEEP_WARM_INTERVAL, provider: str = LLM_PROVIDER) -> bool:
+    global _keep_warm_thread
+    if interval <= 0 or provider.lower() != "ollama":
+        return False
+    if _keep_warm_thread is not None and _keep_warm_thread.is_alive():
+        return True
+    client = OllamaClient(timeout=LLM_DEADLINES.get("ollama", LLM_TIMEOUT))
+
+    def run() -> None:
+        while True:
+            try:
+                client.warm()
+            except Exception as exc:
+                logger.warning("Ollama keep-warm ping failed: %s", exc)
+            time.sleep(interval)
+
+    _keep_warm_thread = threading.Thread(target=run, name="ollama-keep-warm", daemon=True)
+    _keep_warm_thread.start()
+    return True
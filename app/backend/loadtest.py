@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+
+# Nothing from the app is imported at module level: config.py reads the
+# environment on import, and the in-process app must see the stub URLs.
+
+
+class StubSettings:
+    def __init__(
+        self,
+        llm_latency_ms: float = 300.0,
+        tokens_per_second: float = 40.0,
+        output_tokens: int = 200,
+        embedding_latency_ms: float = 10.0,
+        dimensions: int = 384,
+    ):
+        self.llm_latency = llm_latency_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.embedding_latency = embedding_latency_ms / 1000
+        self.dimensions = dimensions
+        self._embedder = None
+        self._lock = threading.Lock()
+
+    def generation_seconds(self) -> float:
+        if self.tokens_per_second <= 0:
+            return self.llm_latency
+        return self.llm_latency + self.output_tokens / self.tokens_per_second
+
+    def answer(self) -> str:
+        return " ".join(["stub"] * self.output_tokens)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            if self._embedder is None:
+                from .benchmarks import HashingEmbedder
+
+                self._embedder = HashingEmbedder(self.dimensions)
+            return self._embedder.embed_texts(texts).tolist()
+
+
+def _stub_handler(settings: StubSettings) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path in ("/api/tags", "/v1/models", "/models"):
+                self._send({"models": [], "data": []})
+            else:
+                self._send({"error": "not found"}, status=404)
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            path = self.path.rstrip("/")
+            if path == "/api/chat":
+                time.sleep(settings.generation_seconds())
+                self._send(
+                    {
+                        "model": body.get("model", ""),
+                        "message": {"role": "assistant", "content": settings.answer()},
+                        "done": True,
+                        "eval_count": settings.output_tokens,
+                    }
+                )
+            elif path == "/api/generate":
+                time.sleep(settings.llm_latency)
+                self._send({"model": body.get("model", ""), "response": "", "done": True})
+            elif path in ("/chat/completions", "/v1/chat/completions"):
+                time.sleep(settings.generation_seconds())
+                self._send(
+                    {
+                        "object": "chat.completion",
+                        "model": body.get("model", ""),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": settings.answer()}}],
+                        "usage": {"completion_tokens": settings.output_tokens},
+                    }
+                )
+            elif path in ("/embeddings", "/v1/embeddings"):
+                inputs = body.get("input", [])
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                time.sleep(settings.embedding_latency)
+                vectors = settings.embed(inputs)
+                self._send(
+                    {
+                        "object": "list",
+                        "model": body.get("model", ""),
+                        "data": [{"index": i, "embedding": v} for i, v in enumerate(vectors)],
+                    }
+                )
+            else:
+                self._send({"error": "not found"}, status=404)
+
+        def _send(self, payload: dict, status: int = 200) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def start_stub_server(settings: StubSettings, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _stub_handler(settings))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server
+
+
+def start_app(stub_url: str, llm_provider: str, corpus_size: int, dimensions: int, data_dir: Path) -> str:
+    os.environ.update(
+        {
+            "DATA_DIR": str(data_dir),
+            "LLM_PROVIDER": llm_provider,
+            "OLLAMA_BASE_URL": stub_url,
+            "REMOTE_BASE_URL": stub_url + "/v1",
+            "REMOTE_API_KEY": "",
+            "EMBEDDING_PROVIDER": "remote",
+            "EMBEDDING_BASE_URL": stub_url + "/v1",
+            "EMBEDDING_API_KEY": "",
+            "EMBEDDING_MODEL": f"stub-hashing-{dimensions}",
+            "VECTOR_STORE_PROVIDER": "local",
+        }
+    )
+    from werkzeug.serving import make_server
+
+    from .benchmarks import synthetic_corpus
+    from .embeddings import get_embedder
+    from .main import app
+    from .vectorstores import get_vector_store
+
+    get_vector_store().save(synthetic_corpus(corpus_size), get_embedder())
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="app-under-test", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_load(
+    target: str,
+    endpoints: List[str],
+    concurrency: int,
+    duration: float,
+    top_k: int,
+    seed: int = 0,
+) -> dict:
+    from .benchmarks import synthetic_queries
+
+    queries = synthetic_queries(200, seed)
+    samples: Dict[str, List[float]] = {endpoint: [] for endpoint in endpoints}
+    errors: Dict[str, int] = {endpoint: 0 for endpoint in endpoints}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(worker_id: int) -> None:
+        rng = random.Random(seed + worker_id)
+        session = requests.Session()
+        i = worker_id
+        while time.monotonic() < stop_at:
+            endpoint = endpoints[i % len(endpoints)]
+            i += 1
+            payload = {"query": rng.choice(queries), "top_k": top_k}
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{target}/api/{endpoint}", json=payload, timeout=300)
+                # /api/chat answers 200 with fallback_answer when the LLM fails.
+                ok = response.status_code == 200 and not response.json().get("error")
+            except (requests.RequestException, ValueError):
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    samples[endpoint].append(elapsed)
+                else:
+                    errors[endpoint] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    results = []
+    for endpoint in endpoints:
+        values = sorted(samples[endpoint])
+        results.append(
+            {
+                "endpoint": f"/api/{endpoint}",
+                "requests": len(values),
+                "errors": errors[endpoint],
+                "throughput_rps": len(values) / wall if wall else 0.0,
+                "mean_ms": statistics.fmean(values) if values else 0.0,
+                "p50_ms": _percentile(values, 50),
+                "p95_ms": _percentile(values, 95),
+                "p99_ms": _percentile(values, 99),
+            }
+        )
+    return {"target": target, "concurrency": concurrency, "duration_seconds": wall, "endpoints": results}
+
+
+def _print_table(report: dict) -> None:
+    print(f"target={report['target']} concurrency={report['concurrency']} duration={report['duration_seconds']:.1f}s")
+    print(f"{'endpoint':<16}{'ok':>8}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in report["endpoints"]:
+        print(
+            f"{row['endpoint']:<16}{row['requests']:>8}{row['errors']:>8}{row['throughput_rps']:>9.2f}"
+            f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test /api/retrieve and /api/chat against stub LLM servers.")
+    parser.add_argument("--target", default="", help="base URL of a running app; by default one is started in-process")
+    parser.add_argument("--endpoints", default="retrieve,chat", help="comma-separated: retrieve, chat")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--llm-provider", choices=["ollama", "remote"], default="ollama")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="stub time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0, help="stub generation rate")
+    parser.add_argument("--output-tokens", type=int, default=200, help="tokens per stub answer")
+    parser.add_argument("--embedding-latency-ms", type=float, default=10.0)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--corpus-size", type=int, default=10000, help="chunks in the in-process app's index")
+    parser.add_argument("--stub-port", type=int, default=0, help="serve the stubs on this port (0 = random)")
+    parser.add_argument("--stub-only", action="store_true", help="only run the stub servers until interrupted")
+    parser.add_argument("--output", type=Path, default=None, help="write the JSON report here")
+    args = parser.parse_args()
+
+    settings = StubSettings(
+        llm_latency_ms=args.llm_latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        embedding_latency_ms=args.embedding_latency_ms,
+        dimensions=args.dimensions,
+    )
+    stub = start_stub_server(settings, port=args.stub_port)
+    stub_url = f"http://127.0.0.1:{stub.server_port}"
+    print(f"Stub Ollama/OpenAI server on {stub_url} (OpenAI-compatible routes also under /v1)")
+    if args.stub_only:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        target = args.target.rstrip("/")
+        if not target:
+            target = start_app(stub_url, args.llm_provider, args.corpus_size, args.dimensions, Path(tmp))
+        endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+        report = run_load(target, endpoints, args.concurrency, args.duration, args.top_k)
+        report["stub"] = {
+            "llm_latency_ms": args.llm_latency_ms,
+            "tokens_per_second": args.tokens_per_second,
+            "output_tokens": args.output_tokens,
+            "embedding_latency_ms": args.embedding_latency_ms,
+        }
+    _print_table(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Sequence
 
-from flask import Flask, Response, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from PIL import Image
 import pytesseract
 
@@ -15,14 +16,31 @@ from .config import (
     LLM_PROVIDER,
     OLLAMA_BASE_URL,
     OLLAMA_MODEL,
+    PDF_DIR,
+    PDF_EXTRACTOR,
+    PRELOAD_INDEXES,
+    PRELOAD_MODEL,
     REMOTE_BASE_URL,
     REMOTE_MODEL,
     TOP_K,
     VECTOR_STORE_PROVIDER,
 )
-from .llms import get_llm_client
+from .embeddings import load_model
+from .jobs import IngestJob, IngestJobRunner, JobConflictError, list_jobs
+from .llms import get_llm_router, start_keep_warm
+from .metrics import (
+    CONTENT_TYPE,
+    HTTP_REQUEST_SECONDS,
+    LLM_FALLBACKS,
+    REGISTRY,
+    observe_stage,
+    request_timings,
+    server_timing_header,
+    start_request_timings,
+)
 from .prompts import build_chat_prompt
-from .rag import VectorIndex
+from .rag import IndexRegistry, SearchFilter, VectorIndex
+from .vectorstores import INDEX_ID, list_indexes, source_name
 
 FRONTEND_DIR = Path(__file__).resolve().parents[1] / "frontend"
 
@@ -33,14 +51,62 @@ _tesseract_default = Path("C:/Program Files/Tesseract-OCR/tesseract.exe")
 if _tesseract_default.exists():
     pytesseract.pytesseract.tesseract_cmd = str(_tesseract_default)
 
-_index: VectorIndex | None = None
+_indexes = IndexRegistry()
+# A finished ingest replaces the index on disk, so drop the stale copy from memory.
+# Other workers notice the new generation of a local index on their next lookup.
+_ingest_jobs = IngestJobRunner(on_complete=lambda job: _indexes.evict(job.index))
+
+
+def get_index(name: str = INDEX_ID) -> VectorIndex:
+    return _indexes.get(name)
+
+
+def preload(names: Sequence[str] = PRELOAD_INDEXES, models: bool = PRELOAD_MODEL) -> List[str]:
+    loaded: List[str] = []
+    for name in names:
+        try:
+            index = _indexes.get(name)
+        except (FileNotFoundError, ValueError) as exc:
+            app.logger.warning("Not preloading index '%s': %s", name, exc)
+            continue
+        if models:
+            load_model(index.embedder)
+        loaded.append(index.name)
+    return loaded
+
+
+def _index_error(exc: Exception) -> tuple[Response, int]:
+    status = 404 if isinstance(exc, FileNotFoundError) else 400
+    return jsonify({"error": str(exc)}), status
+
 
+def _pdf_dir(subdir: str) -> Path:
+    root = PDF_DIR.resolve()
+    path = (root / subdir).resolve()
+    if path != root and root not in path.parents:
+        raise ValueError("pdf_dir must be a folder inside the PDF directory")
+    return path
 
-def get_index() -> VectorIndex:
-    global _index
-    if _index is None:
-        _index = VectorIndex.load()
-    return _index
+
+@app.before_request
+def start_timing() -> None:
+    g.request_started = time.perf_counter()
+    start_request_timings()
+
+
+@app.after_request
+def finish_timing(response: Response) -> Response:
+    elapsed = time.perf_counter() - g.get("request_started", time.perf_counter())
+    HTTP_REQUEST_SECONDS.observe(
+        elapsed,
+        endpoint=request.url_rule.rule if request.url_rule else "unmatched",
+        method=request.method,
+        status=str(response.status_code),
+    )
+    timings = request_timings()
+    timings.append(("total", elapsed))
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
 
 
 @app.get("/")
@@ -53,6 +119,11 @@ def health() -> Response:
     return jsonify({"status": "ok"})
 
 
+@app.get("/metrics")
+def metrics() -> Response:
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
 @app.get("/api/config")
 def config_status() -> Response:
     return jsonify(
@@ -71,11 +142,60 @@ def config_status() -> Response:
     )
 
 
+@app.get("/api/indexes")
+def indexes() -> Response:
+    return jsonify(
+        {
+            "default": INDEX_ID,
+            "available": list_indexes(),
+            "loaded": _indexes.loaded(),
+            "memory_budget_bytes": _indexes.memory_budget,
+        }
+    )
+
+
 @app.post("/api/reindex")
 def reindex() -> Response:
-    global _index
-    _index = VectorIndex.load()
-    return jsonify({"status": "reloaded"})
+    payload: Dict[str, Any] = request.get_json(silent=True) or {}
+    try:
+        index = _indexes.reload(payload.get("index", INDEX_ID))
+    except (FileNotFoundError, ValueError) as exc:
+        return _index_error(exc)
+    return jsonify({"status": "reloaded", "index": index.name})
+
+
+@app.post("/api/ingest")
+def start_ingest() -> Response:
+    payload: Dict[str, Any] = request.get_json(silent=True) or {}
+    try:
+        if payload.get("job_id"):
+            job = _ingest_jobs.resume(str(payload["job_id"]))
+        else:
+            job = _ingest_jobs.start(
+                index=payload.get("index", INDEX_ID),
+                pdf_dir=_pdf_dir(str(payload.get("pdf_dir", ""))),
+                extractor=str(payload.get("extractor", PDF_EXTRACTOR)),
+                resume=bool(payload.get("resume", True)),
+            )
+    except JobConflictError as exc:
+        return jsonify({"error": str(exc)}), 409
+    except (FileNotFoundError, ValueError, RuntimeError) as exc:
+        return _index_error(exc)
+    return jsonify(job.summary()), 202
+
+
+@app.get("/api/ingest")
+def ingest_jobs() -> Response:
+    return jsonify({"jobs": [job.summary() for job in list_jobs()]})
+
+
+@app.get("/api/ingest/<job_id>")
+def ingest_job(job_id: str) -> Response:
+    try:
+        job = IngestJob.load(job_id)
+    except FileNotFoundError as exc:
+        return _index_error(exc)
+    return jsonify(job.summary())
 
 
 @app.post("/api/retrieve")
@@ -84,9 +204,16 @@ def retrieve() -> Response:
     query = str(payload.get("query", "")).strip()
     if not query:
         return jsonify({"error": "Query is required"}), 400
+    try:
+        filters = SearchFilter.from_dict(payload.get("filters"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    index = get_index()
-    chunks = index.search(query, top_k=payload.get("top_k", TOP_K))
+    try:
+        index = get_index(payload.get("index", INDEX_ID))
+    except (FileNotFoundError, ValueError) as exc:
+        return _index_error(exc)
+    chunks = index.search(query, top_k=payload.get("top_k", TOP_K), filters=filters)
     return jsonify(
         {
             "results": [
@@ -114,25 +241,36 @@ def chat() -> Response:
 
     if not query:
         return jsonify({"error": "Query is required"}), 400
+    try:
+        filters = SearchFilter.from_dict(payload.get("filters"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    index = get_index()
-    chunks = index.search(query, top_k=payload.get("top_k", TOP_K))
-    system, prompt = build_chat_prompt(
-        query=query,
-        chunks=chunks,
-        language=language,
-        show_steps=show_steps,
-        mode=mode,
-        user_solution=user_solution,
-    )
+    try:
+        index = get_index(payload.get("index", INDEX_ID))
+    except (FileNotFoundError, ValueError) as exc:
+        return _index_error(exc)
+    chunks = index.search(query, top_k=payload.get("top_k", TOP_K), filters=filters)
+    with observe_stage("build_prompt"):
+        system, prompt = build_chat_prompt(
+            query=query,
+            chunks=chunks,
+            language=language,
+            show_steps=show_steps,
+            mode=mode,
+            user_solution=user_solution,
+        )
 
     response_text = None
     error = None
 
     try:
-        response_text = get_llm_client().chat(system, prompt)
+        with observe_stage("llm"):
+            response_text = get_llm_router().chat(system, prompt)
     except Exception as exc:
         error = str(exc)
+        LLM_FALLBACKS.inc()
+        app.logger.warning("LLM call failed, serving fallback answer: %s", exc)
         response_text = fallback_answer(query, chunks, language)
 
     return jsonify(
@@ -191,10 +329,12 @@ def fallback_answer(query: str, chunks: List[Any], language: str) -> str:
         header = "LLM is not configured. Here are the most relevant sources:"
     lines = [header, ""]
     for c in chunks:
-        lines.append(f"[Source: {Path(c.source).name}, page {c.page}] {c.text[:400]}")
+        lines.append(f"[Source: {source_name(c.source)}, page {c.page}] {c.text[:400]}")
     return "\n".join(lines)
 
 
 
 if __name__ == "__main__":
+    # Under gunicorn this is started per worker by the post_fork hook instead.
+    start_keep_warm()
     app.run(host="0.0.0.0", port=8000, debug=True)
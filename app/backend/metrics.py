@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Sequence, Tuple, TypeVar
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def remove(self, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self) -> List[str]:
+        lines: List[str] = []
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        for key, counts, total in items:
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram("ee_stage_duration_seconds", "Time spent in each request stage.", ["stage"])
+)
+HTTP_REQUEST_SECONDS = REGISTRY.register(
+    Histogram("ee_http_request_duration_seconds", "HTTP request latency.", ["endpoint", "method", "status"])
+)
+ERRORS = REGISTRY.register(
+    Counter("ee_errors_total", "Errors raised by a request stage.", ["stage"])
+)
+LLM_FALLBACKS = REGISTRY.register(
+    Counter("ee_llm_fallbacks_total", "Chat responses served by fallback_answer after an LLM failure.")
+)
+LLM_REQUESTS = REGISTRY.register(
+    Counter("ee_llm_requests_total", "LLM provider calls by result (success, error, skipped).", ["provider", "result"])
+)
+LLM_HEDGES = REGISTRY.register(
+    Counter("ee_llm_hedges_total", "Backup LLM requests sent because the primary exceeded its hedge delay.")
+)
+LLM_HEDGE_POOL_FULL = REGISTRY.register(
+    Counter("ee_llm_hedge_pool_full_total", "LLM calls made without hedging because the hedge pool was busy.")
+)
+LLM_CIRCUIT_OPEN = REGISTRY.register(
+    Gauge("ee_llm_circuit_open", "1 while a provider's circuit breaker is open.", ["provider"])
+)
+CACHE_REQUESTS = REGISTRY.register(
+    Counter("ee_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result"])
+)
+EMBEDDING_BATCH_SIZE = REGISTRY.register(
+    Histogram(
+        "ee_embedding_query_batch_size",
+        "Queries embedded together by the micro-batching embedder.",
+        buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+    )
+)
+INDEX_EVICTIONS = REGISTRY.register(
+    Counter("ee_index_evictions_total", "Loaded indexes evicted to stay within INDEX_MEMORY_BUDGET_MB.")
+)
+INDEX_CHUNKS = REGISTRY.register(
+    Gauge("ee_index_chunks", "Chunks in a loaded vector index.", ["index", "store"])
+)
+INDEX_BYTES = REGISTRY.register(
+    Gauge("ee_index_embedding_bytes", "Bytes of embedding matrix held in process memory.", ["index", "store"])
+)
+
+_request_timings: ContextVar[List[Tuple[str, float]] | None] = ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> None:
+    _request_timings.set([])
+
+
+def request_timings() -> List[Tuple[str, float]]:
+    return list(_request_timings.get() or [])
+
+
+def server_timing_header(timings: Sequence[Tuple[str, float]]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings)
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
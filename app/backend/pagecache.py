@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Dict
+
+from .config import PAGE_CACHE_DIR
+
+_KEY_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageTextCache:
+    # Raw page text (before normalize_text) for one PDF and one extraction setting,
+    # stored as CACHE_DIR/pages/<pdf sha256>/<key>.jsonl. Keyed by content, so a
+    # renamed or copied PDF still hits and an edited one misses.
+    def __init__(self, pdf_sha256: str, key: str, cache_dir: Path = PAGE_CACHE_DIR):
+        self.path = cache_dir / pdf_sha256 / f"{_KEY_RE.sub('_', key)}.jsonl"
+        self._pages: Dict[int, str] | None = None
+
+    def pages(self) -> Dict[int, str]:
+        if self._pages is None:
+            self._pages = self._read()
+        return self._pages
+
+    def get(self, page: int) -> str | None:
+        return self.pages().get(page)
+
+    def put(self, page: int, text: str) -> None:
+        pages = self.pages()
+        if page in pages:
+            return
+        pages[page] = text
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"page": page, "text": text}, ensure_ascii=False) + "\n")
+
+    def _read(self) -> Dict[int, str]:
+        # Pages are appended as they are extracted; a run killed mid-write leaves
+        # at most one broken last line, which is dropped and rewritten.
+        pages: Dict[int, str] = {}
+        if not self.path.exists():
+            return pages
+        raw = self.path.read_text(encoding="utf-8")
+        # Split on "\n" only: splitlines() also breaks on U+2028 and friends, which
+        # json.dumps(ensure_ascii=False) leaves unescaped inside page text.
+        lines = [line for line in raw.split("\n") if line]
+        valid = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            pages[int(record["page"])] = record["text"]
+            valid.append(line)
+        if len(valid) != len(lines) or (raw and not raw.endswith("\n")):
+            self.path.write_text("".join(line + "\n" for line in valid), encoding="utf-8")
+        return pages
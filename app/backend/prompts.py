@@ -1,22 +1,78 @@
 from __future__ import annotations
 
-from pathlib import Path
-from typing import Iterable
+import re
+from typing import Callable, Iterable
 
-from .config import MAX_CONTEXT_CHARS
-from .vectorstores import Chunk
+from .config import CHUNK_OVERLAP, MAX_CONTEXT_CHARS, MAX_CONTEXT_TOKENS
+from .tokenize import get_token_counter
+from .vectorstores import Chunk, source_name
 
+_CHUNK_INDEX_RE = re.compile(r"-c(\d+)$")
+_MIN_OVERLAP = 20
 
-def build_context(chunks: Iterable[Chunk]) -> str:
-    context_parts: list[str] = []
-    total = 0
+
+def _chunk_index(chunk: Chunk) -> int | None:
+    match = _CHUNK_INDEX_RE.search(chunk.chunk_id)
+    return int(match.group(1)) if match else None
+
+
+def _merge_overlap(left: str, right: str, max_overlap: int) -> str | None:
+    longest = min(len(left), len(right), max_overlap)
+    for size in range(longest, _MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return None
+
+
+def merge_spans(chunks: Iterable[Chunk], max_overlap: int = CHUNK_OVERLAP) -> list[tuple[Chunk, str]]:
+    # Group retrieved chunks by source page, keeping the rank of each page's best
+    # chunk, then stitch neighbouring chunks so the shared overlap is sent once.
+    pages: dict[tuple[str, int], list[Chunk]] = {}
     for chunk in chunks:
-        header = f"[Source: {Path(chunk.source).name}, page {chunk.page}]\n"
-        block = header + chunk.text.strip() + "\n"
-        if total + len(block) > MAX_CONTEXT_CHARS:
+        pages.setdefault((chunk.source, chunk.page), []).append(chunk)
+
+    spans: list[tuple[Chunk, str]] = []
+    for group in pages.values():
+        indexes = [_chunk_index(c) for c in group]
+        if all(i is not None for i in indexes):
+            group = [c for _, c in sorted(zip(indexes, group), key=lambda item: item[0])]
+            indexes = sorted(indexes)
+        first = group[0]
+        text = first.text.strip()
+        previous = indexes[0]
+        for chunk, index in zip(group[1:], indexes[1:]):
+            chunk_text = chunk.text.strip()
+            merged = _merge_overlap(text, chunk_text, max_overlap)
+            if merged is None and previous is not None and index == previous + 1:
+                merged = text + " " + chunk_text
+            if merged is None:
+                spans.append((first, text))
+                first, text = chunk, chunk_text
+            else:
+                text = merged
+            previous = index
+        spans.append((first, text))
+    return spans
+
+
+def build_context(
+    chunks: Iterable[Chunk],
+    max_tokens: int = MAX_CONTEXT_TOKENS,
+    count_tokens: Callable[[str], int] | None = None,
+) -> str:
+    count_tokens = count_tokens or get_token_counter()
+    context_parts: list[str] = []
+    total_chars = 0
+    total_tokens = 0
+    for chunk, text in merge_spans(chunks):
+        header = f"[Source: {source_name(chunk.source)}, page {chunk.page}]\n"
+        block = header + text + "\n"
+        tokens = count_tokens(block)
+        if total_tokens + tokens > max_tokens or total_chars + len(block) > MAX_CONTEXT_CHARS:
             break
         context_parts.append(block)
-        total += len(block)
+        total_chars += len(block)
+        total_tokens += tokens
     return "\n".join(context_parts)
 
 
@@ -35,10 +91,12 @@ def build_chat_prompt(
         "Be precise with equations, units, and steps. "
         "If the user asks to check a solution, identify errors and provide corrections."
     )
+    # Static text comes first and per-request text last, so servers that cache the
+    # KV state of a shared prompt prefix can reuse it across questions.
     instructions = [
-        f"Language: {'Bengali' if language == 'bn' else 'English'}.",
         "Use the provided context for factual claims.",
         "If something is not in context, say it is not found in the sources.",
+        f"Language: {'Bengali' if language == 'bn' else 'English'}.",
         f"Provide step-by-step reasoning: {'yes' if show_steps else 'no'}.",
     ]
     if mode == "check":
@@ -49,11 +107,11 @@ def build_chat_prompt(
         user_prompt += f"\n\nUser solution:\n{user_solution}"
 
     prompt = (
-        "CONTEXT:\n"
-        f"{context}\n\n"
         "INSTRUCTIONS:\n"
         + "\n".join(instructions)
-        + "\n\nUSER QUESTION:\n"
+        + "\n\nCONTEXT:\n"
+        + f"{context}\n\n"
+        + "USER QUESTION:\n"
         + user_prompt
     )
     return system, prompt
@@ -1,28 +1,162 @@
 from __future__ import annotations
 
+import threading
+from collections import OrderedDict
 from typing import Iterable, List
 
-from .config import TOP_K
-from .embeddings import Embedder, get_default_embedder
+from .config import INDEX_MEMORY_BUDGET_MB, TOP_K
+from .embeddings import Embedder, get_default_embedder, get_embedder_for
+from .metrics import INDEX_BYTES, INDEX_CHUNKS, INDEX_EVICTIONS, record_cache
 from .prompts import build_context
-from .vectorstores import Chunk, VectorStore, get_vector_store
+from .vectorstores import INDEX_ID, Chunk, SearchFilter, VectorStore, get_vector_store, validate_index_name
+
+# Rough per-chunk cost of the Python objects behind a metadata row, on top of its strings.
+_CHUNK_OVERHEAD_BYTES = 400
 
 
 class VectorIndex:
-    def __init__(self, store: VectorStore, embedder: Embedder):
+    def __init__(self, store: VectorStore, embedder: Embedder, name: str = INDEX_ID):
         self.store = store
         self.embedder = embedder
+        self.name = name
+        self._memory_bytes: int | None = None
 
     @classmethod
-    def load(cls) -> "VectorIndex":
-        embedder = get_default_embedder()
-        store = get_vector_store()
+    def load(cls, name: str = INDEX_ID) -> "VectorIndex":
+        name = validate_index_name(name)
+        store = get_vector_store(index=name)
         if hasattr(store, "load"):
-            store.load(embedder=embedder)  # type: ignore[attr-defined]
-        return cls(store, embedder)
+            store.load()  # type: ignore[attr-defined]
+        config = getattr(store, "embedding_config", {})
+        if config.get("provider") and config.get("model"):
+            embedder = get_embedder_for(config["provider"], config["model"])
+        else:
+            embedder = get_default_embedder()
+        index = cls(store, embedder, name)
+        index.report_size()
+        return index
+
+    def memory_bytes(self) -> int:
+        if self._memory_bytes is None:
+            embeddings = getattr(self.store, "embeddings", None)
+            chunks = getattr(self.store, "chunks", None) or []
+            total = embeddings.nbytes if embeddings is not None else 0
+            for chunk in chunks:
+                total += len(chunk.text) + len(chunk.source) + len(chunk.chunk_id) + len(chunk.title)
+            self._memory_bytes = total + _CHUNK_OVERHEAD_BYTES * len(chunks)
+        return self._memory_bytes
+
+    def report_size(self) -> None:
+        embeddings = getattr(self.store, "embeddings", None)
+        chunks = getattr(self.store, "chunks", None)
+        if chunks is not None:
+            count = len(chunks)
+        else:
+            count = int(getattr(self.store, "embedding_config", {}).get("chunks", 0))
+        INDEX_CHUNKS.set(count, index=self.name, store=self.store.provider)
+        INDEX_BYTES.set(embeddings.nbytes if embeddings is not None else 0, index=self.name, store=self.store.provider)
+
+    def clear_size(self) -> None:
+        INDEX_CHUNKS.remove(index=self.name, store=self.store.provider)
+        INDEX_BYTES.remove(index=self.name, store=self.store.provider)
+
+    def is_stale(self) -> bool:
+        # Another process (an ingest job, /api/reindex in another worker) may have
+        # published a new generation of a local index since this copy was loaded.
+        current_generation = getattr(self.store, "current_generation", None)
+        if current_generation is None:
+            return False
+        return current_generation() != getattr(self.store, "generation", None)
+
+    def search(self, query: str, top_k: int = TOP_K, filters: SearchFilter | None = None) -> List[Chunk]:
+        return self.store.search(query, top_k=top_k, embedder=self.embedder, filters=filters)
+
+
+class IndexRegistry:
+    def __init__(self, memory_budget_mb: float = INDEX_MEMORY_BUDGET_MB):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._indexes: "OrderedDict[str, VectorIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, threading.Lock] = {}
+
+    def get(self, name: str = INDEX_ID) -> VectorIndex:
+        name = validate_index_name(name)
+        index = self._lookup(name)
+        if index is not None:
+            record_cache("index", True)
+            return index
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        # Only one thread loads a given index; the others wait and reuse it.
+        with load_lock:
+            index = self._lookup(name)
+            if index is not None:
+                record_cache("index", True)
+                return index
+            record_cache("index", False)
+            try:
+                index = VectorIndex.load(name)
+            except Exception:
+                # Requests for missing or broken indexes must not leave a lock behind.
+                self._drop_load_lock(name, load_lock)
+                raise
+            return self._insert(index)
+
+    def reload(self, name: str = INDEX_ID) -> VectorIndex:
+        name = validate_index_name(name)
+        self.evict(name)
+        return self.get(name)
+
+    def evict(self, name: str) -> None:
+        with self._lock:
+            index = self._indexes.pop(name, None)
+            self._load_locks.pop(name, None)
+        if index is not None:
+            index.clear_size()
+
+    def loaded(self) -> list[dict]:
+        with self._lock:
+            indexes = list(self._indexes.values())
+        return [
+            {"name": index.name, "store": index.store.provider, "memory_bytes": index.memory_bytes()}
+            for index in indexes
+        ]
+
+    def _lookup(self, name: str) -> VectorIndex | None:
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is not None:
+                self._indexes.move_to_end(name)
+        if index is not None and index.is_stale():
+            with self._lock:
+                if self._indexes.get(name) is index:
+                    del self._indexes[name]
+            index.clear_size()
+            return None
+        return index
+
+    def _drop_load_lock(self, name: str, load_lock: threading.Lock) -> None:
+        with self._lock:
+            if self._load_locks.get(name) is load_lock:
+                del self._load_locks[name]
 
-    def search(self, query: str, top_k: int = TOP_K) -> List[Chunk]:
-        return self.store.search(query, top_k=top_k, embedder=self.embedder)
+    def _insert(self, index: VectorIndex) -> VectorIndex:
+        evicted: list[VectorIndex] = []
+        with self._lock:
+            self._indexes[index.name] = index
+            self._indexes.move_to_end(index.name)
+            if self.memory_budget > 0:
+                total = sum(loaded.memory_bytes() for loaded in self._indexes.values())
+                # Least recently used first; the index just loaded always stays.
+                while total > self.memory_budget and len(self._indexes) > 1:
+                    _, oldest = self._indexes.popitem(last=False)
+                    self._load_locks.pop(oldest.name, None)
+                    total -= oldest.memory_bytes()
+                    evicted.append(oldest)
+        for old in evicted:
+            INDEX_EVICTIONS.inc()
+            old.clear_size()
+        return index
 
 
-__all__ = ["Chunk", "VectorIndex", "build_context"]
+__all__ = ["Chunk", "IndexRegistry", "SearchFilter", "VectorIndex", "build_context"]
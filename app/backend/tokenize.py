@@ -1,10 +1,49 @@
 from __future__ import annotations
 
+import logging
+import math
 import re
-from typing import List
+from functools import lru_cache
+from typing import Callable, List
+
+from .config import CONTEXT_TOKENIZER
 
 _TOKEN_RE = re.compile(r"[A-Za-z0-9_\-\.]+")
+_ESTIMATE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_NON_ASCII_RE = re.compile(r"[^\x00-\x7f]")
+
+logger = logging.getLogger(__name__)
 
 
 def tokenize(text: str) -> List[str]:
     return [t.lower() for t in _TOKEN_RE.findall(text)]
+
+
+def estimate_tokens(text: str) -> int:
+    # Meant as an upper bound, since the context budget must not be exceeded.
+    # Subword tokenizers split long or rare words, identifiers and non-English text
+    # into several tokens, so a word count alone undercounts. This takes the larger
+    # of words and punctuation * 1.3 and one token per 3 ASCII characters, with
+    # every non-ASCII character counted as a token of its own.
+    non_ascii = len(_NON_ASCII_RE.findall(text))
+    by_chars = math.ceil((len(text) - non_ascii) / 3) + non_ascii
+    by_words = math.ceil(len(_ESTIMATE_RE.findall(text)) * 1.3)
+    return max(by_words, by_chars)
+
+
+@lru_cache(maxsize=4)
+def get_token_counter(tokenizer: str = CONTEXT_TOKENIZER) -> Callable[[str], int]:
+    if not tokenizer:
+        return estimate_tokens
+    try:
+        from transformers import AutoTokenizer
+
+        hf_tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+    except Exception as exc:
+        logger.warning("Could not load CONTEXT_TOKENIZER %r (%s); estimating token counts instead", tokenizer, exc)
+        return estimate_tokens
+
+    def count(text: str) -> int:
+        return len(hf_tokenizer.encode(text, add_special_tokens=False))
+
+    return count
@@ -1,17 +1,38 @@
 from __future__ import annotations
 
 import json
+import os
+import re
+import shutil
+import uuid
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Protocol, Sequence
+from typing import Any, Protocol, Sequence
 
 import numpy as np
 
-from .config import DATABASE_URL, INDEX_DIR, VECTOR_STORE_PROVIDER
+from .config import DATABASE_URL, INDEX_DIR, INDEX_MMAP, VECTOR_STORE_PROVIDER
 from .embeddings import Embedder, get_default_embedder
+from .metrics import observe_stage
 
 INDEX_ID = "default"
 
+_INDEX_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_]{0,47}$")
+
+# Matches the file-name part of a stored source path; the pgvector expression
+# index on this exact text lets source filters avoid a sequential scan.
+_SOURCE_NAME_SQL = r"regexp_replace(source, '^.*[/\\]', '')"
+_SOURCE_NAME_RE = re.compile(r"^.*[/\\]", re.DOTALL)
+
+# A local index is a generation folder holding its three files, plus a pointer
+# file naming the current generation. The "-" keeps generation folders from
+# looking like named indexes next to them.
+_CURRENT_FILE = "CURRENT"
+_GENERATION_PREFIX = "gen-"
+_META_FILE = "metadata.jsonl"
+_EMBEDDINGS_FILE = "embeddings.npy"
+_CONFIG_FILE = "embedding_config.json"
+
 
 @dataclass
 class Chunk:
@@ -22,51 +43,154 @@ class Chunk:
     title: str
 
 
+@dataclass(frozen=True)
+class SearchFilter:
+    sources: tuple[str, ...] = ()
+    titles: tuple[str, ...] = ()
+    page_min: int | None = None
+    page_max: int | None = None
+
+    @classmethod
+    def from_dict(cls, raw: dict[str, Any] | None) -> "SearchFilter | None":
+        if not raw:
+            return None
+        if not isinstance(raw, dict):
+            raise ValueError("filters must be an object")
+
+        def names(key: str) -> tuple[str, ...]:
+            value = raw.get(key) or []
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list):
+                raise ValueError(f"filters.{key} must be a string or a list of strings")
+            return tuple(source_name(str(v)) if key == "sources" else str(v) for v in value if str(v).strip())
+
+        def page(key: str) -> int | None:
+            value = raw.get(key)
+            if value is None or value == "":
+                return None
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"filters.{key} must be an integer") from None
+
+        search_filter = cls(names("sources"), names("titles"), page("page_min"), page("page_max"))
+        return None if search_filter.is_empty() else search_filter
+
+    def is_empty(self) -> bool:
+        return not self.sources and not self.titles and self.page_min is None and self.page_max is None
+
+
+def source_name(source: str) -> str:
+    # Same result as _SOURCE_NAME_SQL on every OS. Path(source).name ignores
+    # backslashes on POSIX, so Windows paths would keep their folders there.
+    return _SOURCE_NAME_RE.sub("", source)
+
+
+def validate_index_name(name: str) -> str:
+    name = str(name or INDEX_ID).strip().lower()
+    if not _INDEX_NAME_RE.match(name):
+        raise ValueError("Index names must be 1-48 characters of a-z, 0-9 and _, starting with a letter or digit")
+    return name
+
+
+def index_dir_for(name: str = INDEX_ID) -> Path:
+    # The default index keeps its original location directly under INDEX_DIR.
+    name = validate_index_name(name)
+    return INDEX_DIR if name == INDEX_ID else INDEX_DIR / name
+
+
 class VectorStore(Protocol):
     provider: str
-
-    def search(self, query: str, top_k: int, embedder: Embedder | None = None) -> list[Chunk]:
+    index: str
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        embedder: Embedder | None = None,
+        filters: SearchFilter | None = None,
+    ) -> list[Chunk]:
         ...
 
     def save(self, chunks: Sequence[dict], embedder: Embedder, show_progress_bar: bool = False) -> None:
         ...
 
+    def write(self, chunks: Sequence[dict], embeddings: np.ndarray, embedder: Embedder) -> None:
+        ...
+
 
 class LocalNpyVectorStore:
     provider = "local"
 
-    def __init__(self, index_dir: Path = INDEX_DIR):
-        self.index_dir = index_dir
-        self.meta_file = index_dir / "metadata.jsonl"
-        self.embeddings_file = index_dir / "embeddings.npy"
-        self.config_file = index_dir / "embedding_config.json"
+    def __init__(self, index_dir: Path | None = None, index: str = INDEX_ID, mmap: bool = INDEX_MMAP):
+        self.index = validate_index_name(index)
+        self.index_dir = index_dir if index_dir is not None else index_dir_for(self.index)
+        self.mmap = mmap
+        self.current_file = self.index_dir / _CURRENT_FILE
         self.chunks: list[Chunk] = []
         self.embeddings: np.ndarray | None = None
         self.embedding_config: dict = {}
+        # Generation the loaded files came from; "" for an index without generations.
+        self.generation: str | None = None
+        self._pages = np.empty(0, dtype=np.int32)
+        self._rows_by_source: dict[str, np.ndarray] = {}
+        self._rows_by_title: dict[str, np.ndarray] = {}
+
+    def current_generation(self) -> str:
+        # One small read, cheap enough to check before every search.
+        try:
+            return self.current_file.read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return ""
+
+    def generation_dir(self, generation: str | None = None) -> Path:
+        # Indexes written before generations existed keep their files in index_dir.
+        generation = self.current_generation() if generation is None else generation
+        return self.index_dir / generation if generation else self.index_dir
 
     def load(self, embedder: Embedder | None = None) -> "LocalNpyVectorStore":
-        if not self.embeddings_file.exists() or not self.meta_file.exists():
-            raise FileNotFoundError("Index files not found. Run ingest.py first.")
-        self.chunks = self._read_chunks()
-        self.embeddings = np.load(self.embeddings_file).astype(np.float32, copy=False)
+        # All three files come from the generation read here, so a concurrent
+        # write can never pair new embeddings with old metadata.
+        generation = self.current_generation()
+        base = self.generation_dir(generation)
+        if not (base / _EMBEDDINGS_FILE).exists() or not (base / _META_FILE).exists():
+            raise FileNotFoundError(f"Index '{self.index}' not found. Run ingest.py first.")
+        self.chunks = self._read_chunks(base / _META_FILE)
+        # A read-only memory map is backed by the page cache, so every process that
+        # maps the same file shares one physical copy of the matrix.
+        mmap_mode = "r" if self.mmap else None
+        self.embeddings = np.load(base / _EMBEDDINGS_FILE, mmap_mode=mmap_mode).astype(np.float32, copy=False)
         if len(self.chunks) != self.embeddings.shape[0]:
             raise ValueError(
                 f"Index mismatch: {len(self.chunks)} metadata rows for {self.embeddings.shape[0]} embeddings"
             )
-        if self.config_file.exists():
-            self.embedding_config = json.loads(self.config_file.read_text(encoding="utf-8"))
+        self._build_filter_index()
+        config_file = base / _CONFIG_FILE
+        if config_file.exists():
+            self.embedding_config = json.loads(config_file.read_text(encoding="utf-8"))
             if embedder is not None:
                 self._validate_embedder(embedder)
+        self.generation = generation
         return self
 
     def save(self, chunks: Sequence[dict], embedder: Embedder, show_progress_bar: bool = False) -> None:
-        self.index_dir.mkdir(parents=True, exist_ok=True)
         texts = [chunk["text"] for chunk in chunks]
         embeddings = embedder.embed_texts(texts, show_progress_bar=show_progress_bar)
-        with self.meta_file.open("w", encoding="utf-8") as f:
+        self.write(chunks, embeddings, embedder)
+
+    def write(self, chunks: Sequence[dict], embeddings: np.ndarray, embedder: Embedder) -> None:
+        # Each write goes to a new generation folder and then replaces the pointer
+        # in one os.replace. Readers see either the old or the new index, and
+        # processes with the old embeddings memory-mapped keep reading old files.
+        previous = self.generation_dir()
+        generation = f"{_GENERATION_PREFIX}{uuid.uuid4().hex}"
+        base = self.index_dir / generation
+        base.mkdir(parents=True)
+        with (base / _META_FILE).open("w", encoding="utf-8") as f:
             for chunk in chunks:
                 f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
-        with self.embeddings_file.open("wb") as f:
+        with (base / _EMBEDDINGS_FILE).open("wb") as f:
             np.save(f, embeddings)
         config = {
             "provider": embedder.provider,
@@ -75,27 +199,101 @@ class LocalNpyVectorStore:
             "normalized": True,
             "chunks": len(chunks),
             "vector_store_provider": self.provider,
+            "index": self.index,
         }
-        self.config_file.write_text(json.dumps(config, ensure_ascii=False, indent=2), encoding="utf-8")
+        (base / _CONFIG_FILE).write_text(json.dumps(config, ensure_ascii=False, indent=2), encoding="utf-8")
+        current_tmp = self.current_file.with_suffix(".tmp")
+        current_tmp.write_text(generation, encoding="utf-8")
+        os.replace(current_tmp, self.current_file)
+        self._remove_old_generations(keep={base, previous})
+        self.generation = generation
         self.chunks = [self._chunk_from_dict(chunk) for chunk in chunks]
         self.embeddings = embeddings.astype(np.float32, copy=False)
         self.embedding_config = config
-
-    def search(self, query: str, top_k: int, embedder: Embedder | None = None) -> list[Chunk]:
+        self._build_filter_index()
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        embedder: Embedder | None = None,
+        filters: SearchFilter | None = None,
+    ) -> list[Chunk]:
         if self.embeddings is None:
             self.load(embedder=embedder)
         embedder = embedder or get_default_embedder()
         self._validate_embedder(embedder)
         assert self.embeddings is not None
-        query_embedding = embedder.embed_query(query)
-        scores = self.embeddings @ query_embedding
-        limit = max(1, min(int(top_k), len(self.chunks)))
-        idx = np.argsort(-scores)[:limit]
-        return [self.chunks[i] for i in idx]
-
-    def _read_chunks(self) -> list[Chunk]:
+        rows = self._candidate_rows(filters) if filters is not None else slice(0, len(self.chunks))
+        matrix = self.embeddings[rows]
+        if matrix.shape[0] == 0:
+            return []
+        with observe_stage("embed_query"):
+            query_embedding = embedder.embed_query(query)
+        with observe_stage("vector_search"):
+            scores = matrix @ query_embedding
+            limit = max(1, min(int(top_k), scores.shape[0]))
+            if limit < scores.shape[0]:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+                idx = top[np.argsort(-scores[top])]
+            else:
+                idx = np.argsort(-scores)
+        if isinstance(rows, slice):
+            return [self.chunks[rows.start + i] for i in idx]
+        return [self.chunks[rows[i]] for i in idx]
+
+    def _build_filter_index(self) -> None:
+        # Chunks are written in ingest order, so each source usually occupies one
+        # contiguous block of rows and a filtered search scores only that slice.
+        by_source: dict[str, list[int]] = {}
+        by_title: dict[str, list[int]] = {}
+        for row, chunk in enumerate(self.chunks):
+            by_source.setdefault(source_name(chunk.source), []).append(row)
+            by_title.setdefault(chunk.title, []).append(row)
+        self._pages = np.fromiter((chunk.page for chunk in self.chunks), dtype=np.int32, count=len(self.chunks))
+        self._rows_by_source = {key: np.asarray(rows, dtype=np.int64) for key, rows in by_source.items()}
+        self._rows_by_title = {key: np.asarray(rows, dtype=np.int64) for key, rows in by_title.items()}
+
+    def _candidate_rows(self, filters: SearchFilter) -> slice | np.ndarray:
+        rows: np.ndarray | None = None
+        if filters.sources:
+            rows = _union_rows(self._rows_by_source, filters.sources)
+        if filters.titles:
+            title_rows = _union_rows(self._rows_by_title, filters.titles)
+            rows = title_rows if rows is None else np.intersect1d(rows, title_rows, assume_unique=True)
+        if filters.page_min is not None or filters.page_max is not None:
+            if rows is None:
+                rows = np.arange(len(self.chunks), dtype=np.int64)
+            pages = self._pages[rows]
+            mask = np.ones(len(rows), dtype=bool)
+            if filters.page_min is not None:
+                mask &= pages >= filters.page_min
+            if filters.page_max is not None:
+                mask &= pages <= filters.page_max
+            rows = rows[mask]
+        if rows is None:
+            return slice(0, len(self.chunks))
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            return slice(int(rows[0]), int(rows[-1]) + 1)
+        return rows
+
+    def _remove_old_generations(self, keep: set[Path]) -> None:
+        # The previous generation stays for readers that resolved the pointer just
+        # before the swap; anything older is unreferenced.
+        for path in self.index_dir.glob(f"{_GENERATION_PREFIX}*"):
+            if path.is_dir() and path not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+        if self.index_dir not in keep:
+            for name in (_META_FILE, _EMBEDDINGS_FILE, _CONFIG_FILE):
+                try:
+                    (self.index_dir / name).unlink(missing_ok=True)
+                except OSError:
+                    # Windows refuses to delete files another process has mapped.
+                    pass
+
+    def _read_chunks(self, meta_file: Path) -> list[Chunk]:
         chunks: list[Chunk] = []
-        with self.meta_file.open("r", encoding="utf-8") as f:
+        with meta_file.open("r", encoding="utf-8") as f:
             for line in f:
                 if line.strip():
                     chunks.append(self._chunk_from_dict(json.loads(line)))
@@ -120,8 +318,12 @@ class LocalNpyVectorStore:
 class PgVectorStore:
     provider = "pgvector"
 
-    def __init__(self, database_url: str = DATABASE_URL):
+    def __init__(self, database_url: str = DATABASE_URL, index: str = INDEX_ID):
         self.database_url = database_url
+        self.index = validate_index_name(index)
+        # Each index gets its own table so indexes built with different embedding
+        # models can use different vector dimensions.
+        self.table = "rag_chunks" if self.index == INDEX_ID else f"rag_chunks_{self.index}"
         self.embedding_config: dict = {}
 
     def load(self, embedder: Embedder | None = None) -> "PgVectorStore":
@@ -132,9 +334,12 @@ class PgVectorStore:
         return self
 
     def save(self, chunks: Sequence[dict], embedder: Embedder, show_progress_bar: bool = False) -> None:
-        self._ensure_schema()
         texts = [chunk["text"] for chunk in chunks]
         embeddings = embedder.embed_texts(texts, show_progress_bar=show_progress_bar)
+        self.write(chunks, embeddings, embedder)
+
+    def write(self, chunks: Sequence[dict], embeddings: np.ndarray, embedder: Embedder) -> None:
+        self._ensure_schema()
         dimensions = int(embeddings.shape[1])
         self._ensure_embedding_dimension(dimensions)
 
@@ -162,10 +367,10 @@ class PgVectorStore:
 
         with psycopg.connect(self.database_url) as conn:
             with conn.cursor() as cur:
-                cur.execute("TRUNCATE TABLE rag_chunks")
+                cur.execute(f"TRUNCATE TABLE {self.table}")
                 cur.executemany(
-                    """
-                    INSERT INTO rag_chunks (chunk_id, text, source, page, title, embedding)
+                    f"""
+                    INSERT INTO {self.table} (chunk_id, text, source, page, title, embedding)
                     VALUES (%s, %s, %s, %s, %s, %s::vector)
                     """,
                     rows,
@@ -185,30 +390,39 @@ class PgVectorStore:
                         chunk_count = EXCLUDED.chunk_count,
                         updated_at = now()
                     """,
-                    (INDEX_ID, embedder.provider, embedder.model, dimensions, self.provider, len(chunks)),
+                    (self.index, embedder.provider, embedder.model, dimensions, self.provider, len(chunks)),
                 )
         self.embedding_config = config
 
-    def search(self, query: str, top_k: int, embedder: Embedder | None = None) -> list[Chunk]:
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        embedder: Embedder | None = None,
+        filters: SearchFilter | None = None,
+    ) -> list[Chunk]:
         embedder = embedder or get_default_embedder()
         if not self.embedding_config:
             self.load(embedder=embedder)
         _validate_embedding_config(self.embedding_config, embedder)
-        query_embedding = embedder.embed_query(query)
+        with observe_stage("embed_query"):
+            query_embedding = embedder.embed_query(query)
         limit = max(1, int(top_k))
+        where, params = _filter_sql(filters)
 
         import psycopg
 
-        with psycopg.connect(self.database_url) as conn:
+        with observe_stage("vector_search"), psycopg.connect(self.database_url) as conn:
             with conn.cursor() as cur:
                 cur.execute(
-                    """
+                    f"""
                     SELECT chunk_id, text, source, page, title
-                    FROM rag_chunks
+                    FROM {self.table}
+                    {where}
                     ORDER BY embedding <=> %s::vector
                     LIMIT %s
                     """,
-                    (_to_pgvector(query_embedding), limit),
+                    (*params, _to_pgvector(query_embedding), limit),
                 )
                 return [
                     Chunk(chunk_id=row[0], text=row[1], source=row[2], page=row[3], title=row[4])
@@ -235,8 +449,8 @@ class PgVectorStore:
                     """
                 )
                 cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS rag_chunks (
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {self.table} (
                         id bigserial PRIMARY KEY,
                         chunk_id text NOT NULL UNIQUE,
                         text text NOT NULL,
@@ -247,15 +461,24 @@ class PgVectorStore:
                     )
                     """
                 )
+                cur.execute(
+                    f"""
+                    CREATE INDEX IF NOT EXISTS {self.table}_source_name_page_idx
+                    ON {self.table} (({_SOURCE_NAME_SQL}), page)
+                    """
+                )
+                cur.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self.table}_title_page_idx ON {self.table} (title, page)"
+                )
 
     def _ensure_embedding_dimension(self, dimensions: int) -> None:
         import psycopg
 
         with psycopg.connect(self.database_url) as conn:
             with conn.cursor() as cur:
-                cur.execute("TRUNCATE TABLE rag_chunks")
-                cur.execute("ALTER TABLE rag_chunks DROP COLUMN IF EXISTS embedding")
-                cur.execute(f"ALTER TABLE rag_chunks ADD COLUMN embedding vector({dimensions}) NOT NULL")
+                cur.execute(f"TRUNCATE TABLE {self.table}")
+                cur.execute(f"ALTER TABLE {self.table} DROP COLUMN IF EXISTS embedding")
+                cur.execute(f"ALTER TABLE {self.table} ADD COLUMN embedding vector({dimensions}) NOT NULL")
 
     def _read_embedding_config(self) -> dict:
         import psycopg
@@ -269,11 +492,11 @@ class PgVectorStore:
                     FROM rag_index_metadata
                     WHERE id = %s
                     """,
-                    (INDEX_ID,),
+                    (self.index,),
                 )
                 row = cur.fetchone()
         if row is None:
-            raise FileNotFoundError("pgvector index not found. Run ingest.py first.")
+            raise FileNotFoundError(f"pgvector index '{self.index}' not found. Run ingest.py first.")
         return {
             "provider": row[0],
             "model": row[1],
@@ -295,14 +518,73 @@ def _validate_embedding_config(config: dict, embedder: Embedder) -> None:
         )
 
 
+def _union_rows(rows_by_key: dict[str, np.ndarray], keys: Sequence[str]) -> np.ndarray:
+    found = [rows_by_key[key] for key in keys if key in rows_by_key]
+    if not found:
+        return np.empty(0, dtype=np.int64)
+    if len(found) == 1:
+        return found[0]
+    return np.unique(np.concatenate(found))
+
+
+def _filter_sql(filters: SearchFilter | None) -> tuple[str, list]:
+    if filters is None:
+        return "", []
+    clauses: list[str] = []
+    params: list = []
+    if filters.sources:
+        clauses.append(f"{_SOURCE_NAME_SQL} = ANY(%s)")
+        params.append(list(filters.sources))
+    if filters.titles:
+        clauses.append("title = ANY(%s)")
+        params.append(list(filters.titles))
+    if filters.page_min is not None:
+        clauses.append("page >= %s")
+        params.append(filters.page_min)
+    if filters.page_max is not None:
+        clauses.append("page <= %s")
+        params.append(filters.page_max)
+    if not clauses:
+        return "", []
+    return "WHERE " + " AND ".join(clauses), params
+
+
 def _to_pgvector(vector: np.ndarray) -> str:
     return "[" + ",".join(str(float(value)) for value in vector.tolist()) + "]"
 
 
-def get_vector_store(provider: str = VECTOR_STORE_PROVIDER) -> VectorStore:
+def _has_local_index(index_dir: Path) -> bool:
+    return (index_dir / _CURRENT_FILE).exists() or (index_dir / _EMBEDDINGS_FILE).exists()
+
+
+def list_indexes(provider: str = VECTOR_STORE_PROVIDER) -> list[str]:
+    provider = provider.lower()
+    if provider == "local":
+        names = [INDEX_ID] if _has_local_index(INDEX_DIR) else []
+        if INDEX_DIR.exists():
+            names.extend(
+                path.name
+                for path in sorted(INDEX_DIR.iterdir())
+                if path.is_dir() and _INDEX_NAME_RE.match(path.name) and _has_local_index(path)
+            )
+        return names
+    if provider == "pgvector":
+        import psycopg
+
+        with psycopg.connect(DATABASE_URL) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('rag_index_metadata')")
+                if cur.fetchone()[0] is None:
+                    return []
+                cur.execute("SELECT id FROM rag_index_metadata ORDER BY id")
+                return [row[0] for row in cur.fetchall()]
+    raise RuntimeError(f"Unsupported vector store provider: {provider}")
+
+
+def get_vector_store(provider: str = VECTOR_STORE_PROVIDER, index: str = INDEX_ID) -> VectorStore:
     provider = provider.lower()
     if provider == "local":
-        return LocalNpyVectorStore()
+        return LocalNpyVectorStore(index=index)
     if provider == "pgvector":
-        return PgVectorStore()
+        return PgVectorStore(index=index)
     raise RuntimeError(f"Unsupported vector store provider: {provider}")
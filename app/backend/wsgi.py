@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import gc
+
+from .main import app, preload
+
+# Imported once in the gunicorn master (preload_app), so workers fork with the
+# index and embedding model already in memory and share those pages.
+preload()
+# Objects allocated so far are moved out of the collector's generations. A
+# collection in a worker would otherwise write to their headers and turn the
+# shared pages into private copies.
+gc.freeze()
+
+__all__ = ["app"]
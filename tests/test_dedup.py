@@ -0,0 +1,46 @@
+import numpy as np
+
+from app.backend.benchmarks import HashingEmbedder
+from app.backend.dedup import dedup_chunks, expand_shared_vectors, rows_to_embed
+from app.backend.vectorstores import LocalNpyVectorStore, SearchFilter
+
+SHARED = "Kirchhoff's current law states that the currents entering a node sum to zero. " * 4
+OWN = "A synchronous generator delivers reactive power when it is overexcited. " * 4
+
+
+def _chunk(source: str, page: int, text: str) -> dict:
+    title = source.rsplit(".", 1)[0]
+    return {"chunk_id": f"{title}-p{page}-c1", "text": text, "source": f"/pdfs/{source}", "page": page, "title": title}
+
+
+def test_duplicates_within_a_source_are_dropped():
+    chunks = [_chunk("A.pdf", 1, SHARED), _chunk("A.pdf", 2, SHARED), _chunk("A.pdf", 3, OWN)]
+    unique, duplicates = dedup_chunks(chunks)
+    assert [c["chunk_id"] for c in unique] == ["A-p1-c1", "A-p3-c1"]
+    assert duplicates[0]["chunk_id"] == "A-p2-c1"
+    assert duplicates[0]["duplicate_of"] == "A-p1-c1"
+
+
+def test_copies_in_other_sources_share_the_canonical_vector(tmp_path):
+    chunks = [
+        _chunk("A.pdf", 1, SHARED),
+        _chunk("A.pdf", 2, OWN),
+        _chunk("B.pdf", 1, SHARED),
+        _chunk("B.pdf", 2, SHARED),
+    ]
+    rows, duplicates = dedup_chunks(chunks)
+    assert [row["chunk_id"] for row in rows] == ["A-p1-c1", "A-p2-c1", "B-p1-c1"]
+    assert rows[2]["shares_vector_of"] == "A-p1-c1"
+    assert [(d["chunk_id"], d["duplicate_of"]) for d in duplicates] == [("B-p2-c1", "B-p1-c1")]
+
+    embedder = HashingEmbedder()
+    unique = rows_to_embed(rows)
+    assert [row["chunk_id"] for row in unique] == ["A-p1-c1", "A-p2-c1"]
+    embeddings = expand_shared_vectors(rows, embedder.embed_texts([row["text"] for row in unique]))
+    assert np.array_equal(embeddings[2], embeddings[0])
+
+    store = LocalNpyVectorStore(tmp_path)
+    store.write(rows, embeddings, embedder)
+    search_filter = SearchFilter(sources=("B.pdf",), page_min=1, page_max=1)
+    hits = store.search("currents entering a node", top_k=3, embedder=embedder, filters=search_filter)
+    assert [(hit.chunk_id, hit.source, hit.page) for hit in hits] == [("B-p1-c1", "/pdfs/B.pdf", 1)]
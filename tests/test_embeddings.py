@@ -0,0 +1,89 @@
+import enum
+import sys
+import types
+
+import pytest
+
+from app.backend import embeddings
+
+
+class QuantType(enum.Enum):
+    QInt8 = 0
+    QUInt8 = 1
+
+
+# Weight types of optimum's AutoQuantizationConfig presets.
+WEIGHT_TYPES = {
+    "arm64": QuantType.QInt8,
+    "avx2": QuantType.QUInt8,
+    "avx512": QuantType.QUInt8,
+    "avx512_vnni": QuantType.QInt8,
+}
+
+
+@pytest.fixture
+def fake_export(tmp_path, monkeypatch):
+    exports = []
+
+    class AutoQuantizationConfig:
+        pass
+
+    def preset(weights_dtype):
+        return staticmethod(lambda **kwargs: types.SimpleNamespace(weights_dtype=weights_dtype))
+
+    for name, weights_dtype in WEIGHT_TYPES.items():
+        setattr(AutoQuantizationConfig, name, preset(weights_dtype))
+
+    class SentenceTransformer:
+        def __init__(self, model, backend="torch", **kwargs):
+            self.model = model
+
+        def save(self, path):
+            pass
+
+    def export_dynamic_quantized_onnx_model(model, config, path, push_to_hub=False, create_pr=False, file_suffix=None):
+        # Mirrors sentence-transformers: model_<weights dtype>_<config>.onnx by default.
+        file_suffix = file_suffix or f"{WEIGHT_TYPES[config].name.lower()}_{config}"
+        target = embeddings.Path(path) / "onnx" / f"model_{file_suffix}.onnx"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(b"onnx")
+        exports.append(config)
+
+    configuration = types.ModuleType("optimum.onnxruntime.configuration")
+    configuration.AutoQuantizationConfig = AutoQuantizationConfig
+    sentence_transformers = types.ModuleType("sentence_transformers")
+    sentence_transformers.SentenceTransformer = SentenceTransformer
+    sentence_transformers.export_dynamic_quantized_onnx_model = export_dynamic_quantized_onnx_model
+    monkeypatch.setitem(sys.modules, "optimum", types.ModuleType("optimum"))
+    monkeypatch.setitem(sys.modules, "optimum.onnxruntime", types.ModuleType("optimum.onnxruntime"))
+    monkeypatch.setitem(sys.modules, "optimum.onnxruntime.configuration", configuration)
+    monkeypatch.setitem(sys.modules, "sentence_transformers", sentence_transformers)
+    monkeypatch.setattr(embeddings, "CACHE_DIR", tmp_path)
+    return exports
+
+
+@pytest.mark.parametrize(
+    "config, file_name",
+    [
+        ("arm64", "onnx/model_qint8_arm64.onnx"),
+        ("avx2", "onnx/model_quint8_avx2.onnx"),
+        ("avx512", "onnx/model_quint8_avx512.onnx"),
+        ("avx512_vnni", "onnx/model_qint8_avx512_vnni.onnx"),
+    ],
+)
+def test_quantized_onnx_file_name_matches_export(fake_export, config, file_name):
+    embedder = embeddings.LocalSentenceTransformerEmbedder(
+        model="org/model", backend="onnx", quantization="int8", onnx_quant_config=config
+    )
+    export_dir, resolved = embedder._export_quantized_onnx()
+    assert resolved == file_name
+    assert (export_dir / resolved).exists()
+
+    # The cached export is found on the next start instead of being redone.
+    embedder._export_quantized_onnx()
+    assert fake_export == [config]
+
+
+def test_rejects_unknown_onnx_quant_config():
+    with pytest.raises(RuntimeError):
+        embeddings.onnx_quant_file_suffix("sse4")
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from app.backend.llms import LLMRouter
+
+
+class _Client:
+    def __init__(self, provider: str, delay: float):
+        self.provider = provider
+        self.model = provider
+        self.delay = delay
+        self.threads: list[str] = []
+
+    def chat(self, system: str, prompt: str) -> str:
+        self.threads.append(threading.current_thread().name)
+        time.sleep(self.delay)
+        return self.provider
+
+
+def test_hedge_answers_when_primary_is_slow():
+    slow, fast = _Client("slow", 0.5), _Client("fast", 0.0)
+    router = LLMRouter([slow, fast], hedge=True, hedge_delay=0.05, pool_size=4)
+    assert router.chat("system", "prompt") == "fast"
+
+
+def test_full_pool_runs_primary_on_request_thread_without_hedging():
+    slow, fast = _Client("slow", 0.3), _Client("fast", 0.0)
+    router = LLMRouter([slow, fast], hedge=True, hedge_delay=0.05, pool_size=1)
+    router._slots.acquire()
+    try:
+        assert router.chat("system", "prompt") == "slow"
+    finally:
+        router._slots.release()
+    assert slow.threads == [threading.current_thread().name]
+    assert fast.threads == []
@@ -0,0 +1,51 @@
+from functools import partial
+
+from app.backend import ingest
+from app.backend.extractors import PageText
+from app.backend.pagecache import PageTextCache
+
+
+def test_round_trips_unicode_line_separators(tmp_path):
+    text = "Line one\u2028line two\u2029next paragraph\x85end"
+    PageTextCache("abc", "pdfium-1", tmp_path).put(0, text)
+    PageTextCache("abc", "pdfium-1", tmp_path).put(1, "second page")
+
+    cache = PageTextCache("abc", "pdfium-1", tmp_path)
+    assert cache.pages() == {0: text, 1: "second page"}
+    assert len(cache.path.read_text(encoding="utf-8").split("\n")) == 3
+
+
+def test_drops_partial_last_line(tmp_path):
+    cache = PageTextCache("abc", "pdfium-1", tmp_path)
+    cache.put(0, "first page")
+    with cache.path.open("a", encoding="utf-8") as f:
+        f.write('{"page": 1, "te')
+
+    assert PageTextCache("abc", "pdfium-1", tmp_path).pages() == {0: "first page"}
+    assert cache.path.read_text(encoding="utf-8").endswith("}\n")
+
+
+class _BlankExtractor:
+    name = "blank"
+    cache_key = "blank-1"
+
+    def extract_pages(self, pdf_path, stats=None, skip_pages=frozenset()):
+        for i in range(2):
+            if i not in skip_pages:
+                yield PageText(i, "", self.name)
+
+
+def test_failed_ocr_is_not_cached(tmp_path, monkeypatch):
+    pdf = tmp_path / "scan.pdf"
+    pdf.write_bytes(b"%PDF-1.4 scanned")
+    monkeypatch.setattr(ingest, "PageTextCache", partial(PageTextCache, cache_dir=tmp_path / "cache"))
+    monkeypatch.setattr(ingest, "page_count", lambda path: 2)
+    monkeypatch.setattr(ingest, "ocr_cache_key", lambda: "ocr-test")
+
+    monkeypatch.setattr(ingest, "page_text_with_ocr", lambda path, page: None)
+    assert [chunks for _, chunks in ingest.iter_page_chunks(pdf, _BlankExtractor(), use_cache=True)] == [[], []]
+
+    ocr_text = "Recovered text from a scanned page about transformer winding ratios."
+    monkeypatch.setattr(ingest, "page_text_with_ocr", lambda path, page: ocr_text)
+    pages = [chunks for _, chunks in ingest.iter_page_chunks(pdf, _BlankExtractor(), use_cache=True)]
+    assert [chunks[0]["text"] for chunks in pages] == [ocr_text, ocr_text]
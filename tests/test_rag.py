@@ -0,0 +1,30 @@
+from app.backend import rag, vectorstores
+from app.backend.benchmarks import HashingEmbedder
+from app.backend.rag import IndexRegistry
+from app.backend.vectorstores import LocalNpyVectorStore
+
+
+def _chunks(prefix: str, n: int) -> list[dict]:
+    return [
+        {"chunk_id": f"{prefix}-{i}", "text": f"{prefix} text {i}", "source": "A.pdf", "page": i, "title": "A"}
+        for i in range(n)
+    ]
+
+
+def test_registry_reloads_an_index_written_by_another_process(tmp_path, monkeypatch):
+    embedder = HashingEmbedder()
+    monkeypatch.setattr(vectorstores, "INDEX_DIR", tmp_path)
+    monkeypatch.setattr(rag, "get_embedder_for", lambda provider, model: embedder)
+    LocalNpyVectorStore(index="ee101").save(_chunks("old", 2), embedder)
+
+    worker = IndexRegistry()
+    first = worker.get("ee101")
+    assert worker.get("ee101") is first
+    assert len(first.store.chunks) == 2
+
+    # Another worker or the ingest process publishes a new generation.
+    LocalNpyVectorStore(index="ee101").save(_chunks("new", 3), embedder)
+    reloaded = worker.get("ee101")
+    assert reloaded is not first
+    assert [chunk.chunk_id for chunk in reloaded.store.chunks] == ["new-0", "new-1", "new-2"]
+    assert worker.get("ee101") is reloaded
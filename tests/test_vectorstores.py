@@ -0,0 +1,59 @@
+from app.backend.benchmarks import HashingEmbedder
+from app.backend.vectorstores import LocalNpyVectorStore, SearchFilter, source_name
+
+
+def test_source_name_strips_posix_and_windows_folders():
+    assert source_name("/data/pdfs/A.pdf") == "A.pdf"
+    assert source_name("C:\\Users\\me\\pdfs\\B.pdf") == "B.pdf"
+    assert source_name("B.pdf") == "B.pdf"
+
+
+def test_source_filter_matches_windows_paths(tmp_path):
+    chunks = [
+        {"chunk_id": "a-1", "text": "ohm law", "source": "/data/pdfs/A.pdf", "page": 1, "title": "A"},
+        {"chunk_id": "b-1", "text": "ohm law", "source": "C:\\pdfs\\B.pdf", "page": 1, "title": "B"},
+    ]
+    embedder = HashingEmbedder()
+    store = LocalNpyVectorStore(tmp_path)
+    store.save(chunks, embedder)
+    search_filter = SearchFilter.from_dict({"sources": ["D:\\other\\B.pdf"]})
+    assert [hit.chunk_id for hit in store.search("ohm", 5, embedder, search_filter)] == ["b-1"]
+
+
+def _chunks(n: int, prefix: str) -> list[dict]:
+    return [
+        {"chunk_id": f"{prefix}-{i}", "text": f"{prefix} chunk {i}", "source": "A.pdf", "page": i, "title": "A"}
+        for i in range(n)
+    ]
+
+
+def test_write_swaps_generations_atomically(tmp_path):
+    embedder = HashingEmbedder()
+    LocalNpyVectorStore(tmp_path).save(_chunks(3, "old"), embedder)
+    reader = LocalNpyVectorStore(tmp_path, mmap=True).load(embedder)
+
+    LocalNpyVectorStore(tmp_path).save(_chunks(5, "new"), embedder)
+    LocalNpyVectorStore(tmp_path).save(_chunks(4, "newer"), embedder)
+
+    # The earlier reader keeps its own consistent view of the files it mapped.
+    assert len(reader.chunks) == reader.embeddings.shape[0] == 3
+    latest = LocalNpyVectorStore(tmp_path).load(embedder)
+    assert [c.chunk_id for c in latest.chunks] == [f"newer-{i}" for i in range(4)]
+    assert len(list(tmp_path.glob("gen-*"))) == 2
+
+
+def test_loads_and_replaces_an_index_without_generations(tmp_path):
+    embedder = HashingEmbedder()
+    store = LocalNpyVectorStore(tmp_path)
+    store.save(_chunks(2, "legacy"), embedder)
+    generation = store.generation_dir()
+    for path in generation.iterdir():
+        path.rename(tmp_path / path.name)
+    generation.rmdir()
+    (tmp_path / "CURRENT").unlink()
+
+    assert len(LocalNpyVectorStore(tmp_path).load(embedder).chunks) == 2
+    LocalNpyVectorStore(tmp_path).save(_chunks(3, "new"), embedder)
+    LocalNpyVectorStore(tmp_path).save(_chunks(3, "newer"), embedder)
+    assert not (tmp_path / "embeddings.npy").exists()
+    assert len(LocalNpyVectorStore(tmp_path).load(embedder).chunks) == 3